@@ -0,0 +1,604 @@
+import argparse
+import json
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime, timezone
+
+import numpy as np
+
+import cryptoanalysis
+import key_generator
+import language
+import ngram
+import vigenere
+
+INPUT_FILE = "input.txt"
+KEY = "ЩФЛЗАРСХГЮВКМЕЙЦЖЮБТЪЧЫПИЖНУЭЙДЯФЪЖЧТЬБХЦЩСШЫМЖЮЩДЪГШЭНПЕВХЧЩЫГТЯЦЙЖЩЮЭЛЬБЕФВХЪЧДЛИЫКР"
+TEXT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+KASISKI_SIZES = [10_000, 100_000, 1_000_000, 10_000_000, 100_000_000]
+# Исходный алгоритм Касиски квадратичен, поэтому сравниваем только на малых текстах
+KASISKI_REFERENCE_LIMIT = 100_000
+
+# Проверка совпадения с исходными реализациями: число случайных текстов и
+# наибольшая длина (исходный метод Касиски квадратичен)
+CHECK_RANDOM_CASES = 100
+CHECK_MAX_SIZE = 2000
+
+# Метод Фридмана: размеры текста и границы периода; путь через гистограммы
+# измеряется, пока размер * период не больше FRIEDMAN_HISTOGRAM_LIMIT, а путь
+# через БПФ - пока размер БПФ не больше FRIEDMAN_FFT_LIMIT
+FRIEDMAN_SIZES = [10_000, 100_000, 1_000_000, 10_000_000]
+FRIEDMAN_MAX_PERIODS = [20, 100, 1000]
+FRIEDMAN_HISTOGRAM_LIMIT = 2_000_000_000
+FRIEDMAN_FFT_LIMIT = 1 << 23
+
+# Параметры набора бенчмарков по умолчанию
+SUITE_SIZES = [10_000, 100_000]
+SUITE_KEY_LENGTHS = [5, 20, 100]
+SUITE_DISTRIBUTIONS = {
+    "uniform": key_generator.generate_uniform,
+    "normal": key_generator.generate_normal,
+    "binomial": key_generator.generate_binomial,
+    "poisson": key_generator.generate_poisson,
+    "gamma": key_generator.generate_gamma,
+}
+# Модули точек входа, для которых измеряется время импорта
+ENTRY_POINT_MODULES = ["main", "key_generator", "benchmark", "text_cleaning", "ngram"]
+
+SUITE_OPERATIONS = [
+    "clean_text",
+    "vigenere_encrypt",
+    "vigenere_decrypt",
+    "kasiski_examination",
+    "frequency_attack",
+    "refine_key",
+    "candidate_keys",
+]
+
+
+def reference_encrypt(plaintext, key):
+    """Посимвольное шифрование (исходная реализация) для сравнения"""
+    plaintext = vigenere.clean_text(plaintext)
+    key = vigenere.clean_text(key)
+    if not key:
+        return plaintext
+
+    alphabet = vigenere.ALPHABET
+    n = len(alphabet)
+    char_to_index = {char: i for i, char in enumerate(alphabet)}
+
+    ciphertext = []
+    key_len = len(key)
+    for i, char in enumerate(plaintext):
+        p_idx = char_to_index[char]
+        k_idx = char_to_index[key[i % key_len]]
+        ciphertext.append(alphabet[(p_idx + k_idx) % n])
+    return "".join(ciphertext)
+
+
+def reference_decrypt(ciphertext, key):
+    """Посимвольное дешифрование (исходная реализация) для сравнения"""
+    ciphertext = vigenere.clean_text(ciphertext)
+    key = vigenere.clean_text(key)
+    if not key:
+        return ciphertext
+
+    alphabet = vigenere.ALPHABET
+    n = len(alphabet)
+    char_to_index = {char: i for i, char in enumerate(alphabet)}
+
+    plaintext = []
+    key_len = len(key)
+    for i, char in enumerate(ciphertext):
+        c_idx = char_to_index[char]
+        k_idx = char_to_index[key[i % key_len]]
+        plaintext.append(alphabet[(c_idx - k_idx) % n])
+    return "".join(plaintext)
+
+
+def reference_frequency_attack(ciphertext, key_length):
+    """Частотный анализ перебором сдвигов со счётчиком букв (исходная реализация)"""
+    alphabet = vigenere.ALPHABET
+    n = len(alphabet)
+    char_to_index = {char: i for i, char in enumerate(alphabet)}
+    frequencies = language.CURRENT.frequencies
+    key = []
+    for i in range(key_length):
+        block = ciphertext[i::key_length]
+        if len(block) == 0:
+            key.append(alphabet[0])
+            continue
+        candidates = []
+        for shift in range(n):
+            decrypted = "".join(alphabet[(char_to_index[c] - shift) % n] for c in block)
+            freq = Counter(decrypted)
+            total = len(decrypted)
+            chi2 = 0
+            for char, count in freq.items():
+                observed = count / total * 100
+                expected = frequencies.get(char, language.MISSING_FREQUENCY)
+                chi2 += (observed - expected) ** 2 / expected
+            candidates.append((shift, chi2))
+        candidates.sort(key=lambda x: x[1])
+        key.append(alphabet[candidates[0][0]])
+    return "".join(key)
+
+
+def reference_kasiski(ciphertext, max_key_length=20):
+    """Метод Касиски со словарём строк и списком расстояний (исходная реализация)"""
+    sequences = {}
+    for length in range(3, 6):
+        for i in range(len(ciphertext) - length):
+            seq = ciphertext[i : i + length]
+            if seq in sequences:
+                sequences[seq].append(i)
+            else:
+                sequences[seq] = [i]
+
+    repeats = {
+        seq: positions for seq, positions in sequences.items() if len(positions) > 1
+    }
+
+    distances = []
+    for positions in repeats.values():
+        for i in range(len(positions)):
+            for j in range(i + 1, len(positions)):
+                distances.append(positions[j] - positions[i])
+
+    factors = Counter()
+    for dist in distances:
+        for i in range(2, min(dist, max_key_length) + 1):
+            if dist % i == 0:
+                factors[i] += 1
+
+    if factors:
+        return [length for length, _ in factors.most_common(3)]
+    return [1]
+
+
+def measure(func, *args):
+    """Время одного вызова функции"""
+    start_time = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start_time, result
+
+
+def make_text(size):
+    """Текст нужной длины, собранный повторением input.txt"""
+    with open(INPUT_FILE, "r", encoding="utf-8") as f:
+        text = f.read()
+    repeats = size // len(text) + 1
+    return (text * repeats)[:size]
+
+
+def make_encoded(size):
+    """Закодированный текст нужной длины без построения строки"""
+    with open(INPUT_FILE, "r", encoding="utf-8") as f:
+        indices = vigenere.encode_text(f.read())
+    repeats = size // len(indices) + 1
+    return vigenere.EncodedText(np.tile(indices, repeats)[:size])
+
+
+def bench_kasiski(max_size=None):
+    """Масштабирование метода Касиски от 10 КБ до 100 МБ шифртекста"""
+    print(f"{'Размер':>11} {'Исходный, с':>12} {'Новый, с':>10} {'Длины ключа':>14}")
+    for size in KASISKI_SIZES:
+        if max_size is not None and size > max_size:
+            break
+        ciphertext = vigenere.vigenere_encrypt(make_encoded(size), KEY)
+        new_time, lengths = measure(cryptoanalysis.kasiski_examination, ciphertext)
+        ref_column = "-"
+        if size <= KASISKI_REFERENCE_LIMIT:
+            ref_time, expected = measure(reference_kasiski, str(ciphertext))
+            if lengths != expected:
+                raise AssertionError(f"Результаты не совпадают: {size}")
+            ref_column = f"{ref_time:.4f}"
+        print(f"{size:>11} {ref_column:>12} {new_time:>10.4f} {str(lengths):>14}")
+
+
+def measure_peak(func, *args):
+    """Время вызова и пик памяти NumPy (МБ) по tracemalloc"""
+    tracemalloc.start()
+    try:
+        elapsed, result = measure(func, *args)
+        peak = tracemalloc.get_traced_memory()[1] / 2**20
+    finally:
+        tracemalloc.stop()
+    return elapsed, peak, result
+
+
+def bench_friedman(max_size=None):
+    """Масштабирование метода Фридмана: гистограммы против БПФ по размеру текста
+
+    Для каждого размера и границы периода измеряются оба пути подсчёта пар
+    (в пределах FRIEDMAN_*_LIMIT) и проверяется, что они совпадают; "*"
+    отмечает путь, который выбирает cryptoanalysis._ic_confidence.
+    """
+    header = ["Размер", "Период", "Гистограммы, с", "МБ", "БПФ, с", "МБ"]
+    print("{:>11} {:>7} {:>15} {:>7} {:>10} {:>7}".format(*header))
+    for size in FRIEDMAN_SIZES:
+        if max_size is not None and size > max_size:
+            break
+        ciphertext = vigenere.vigenere_encrypt(make_encoded(size), KEY).indices[None]
+        for max_period in FRIEDMAN_MAX_PERIODS:
+            selected = cryptoanalysis._uses_coincidences(size, max_period)
+            columns, results = [], []
+            for uses_fft, func, fits in [
+                (
+                    False,
+                    cryptoanalysis._pairs_by_histograms,
+                    size * max_period <= FRIEDMAN_HISTOGRAM_LIMIT,
+                ),
+                (
+                    True,
+                    cryptoanalysis._pairs_by_coincidences,
+                    cryptoanalysis._fft_size(size) <= FRIEDMAN_FFT_LIMIT,
+                ),
+            ]:
+                if not fits:
+                    columns += ["-", "-"]
+                    continue
+                elapsed, peak, pairs = measure_peak(func, ciphertext, max_period)
+                results.append(pairs)
+                marker = "*" if uses_fft == selected else " "
+                columns += [f"{elapsed:.4f}{marker}", f"{peak:.0f}"]
+            if len(results) == 2 and not np.array_equal(*results):
+                raise AssertionError(f"Результаты не совпадают: {size}, {max_period}")
+            print(
+                "{:>11} {:>7} {:>15} {:>7} {:>10} {:>7}".format(
+                    size, max_period, *columns
+                )
+            )
+
+
+def check_cases(seed, random_cases=CHECK_RANDOM_CASES):
+    """Шифртексты для проверки: короткие, вырожденные, с ничьими и случайные"""
+    alphabet = vigenere.ALPHABET
+    # Короткие тексты и тексты из одной буквы: у всех сдвигов равные chi2
+    for size in range(8):
+        yield alphabet[:size]
+        yield alphabet[0] * size
+    # Повторяющиеся короткие шаблоны: много повторов и равных счётов делителей
+    for pattern in ["АБ", "АБВ", "АББА", "АБВГДЕ", "ЯЯА"]:
+        for repeats in (2, 5, 40, 200):
+            yield pattern * repeats
+    # Равные доли нескольких букв: ничьи chi2 между сдвигами
+    for letters in (2, 3, 4, 8):
+        yield "".join(alphabet[i * 4] for i in range(letters)) * 25
+    rng = random.Random(seed)
+    text = str(make_encoded(CHECK_MAX_SIZE * 4))
+    for _ in range(random_cases):
+        size = rng.randint(1, CHECK_MAX_SIZE)
+        start = rng.randrange(len(text) - size)
+        key = "".join(rng.choices(alphabet, k=rng.randint(1, 40)))
+        yield str(vigenere.vigenere_encrypt(text[start : start + size], key))
+
+
+def check_reference(seed=0, random_cases=CHECK_RANDOM_CASES):
+    """Проверка совпадения chi2-анализа и метода Касиски с исходными реализациями
+
+    Векторные реализации должны давать те же ключи и длины, включая выбор
+    при равных chi2 и порядок делителей с равным числом повторов.
+    """
+    checked = 0
+    for ciphertext in check_cases(seed, random_cases):
+        kasiski = cryptoanalysis.kasiski_examination(ciphertext)
+        expected = reference_kasiski(ciphertext)
+        if kasiski != expected:
+            raise AssertionError(
+                f"Касиски: {kasiski} != {expected} для {ciphertext[:40]!r}"
+            )
+        for key_length in {1, 2, 3, 7, *kasiski, len(ciphertext) + 1}:
+            key = cryptoanalysis.frequency_attack(ciphertext, key_length)
+            expected = reference_frequency_attack(ciphertext, key_length)
+            if key != expected:
+                raise AssertionError(
+                    f"Частотный анализ ({key_length}): {key} != {expected} "
+                    f"для {ciphertext[:40]!r}"
+                )
+        checked += 1
+    print(f"Совпадает с исходными реализациями: {checked} шифртекстов")
+
+
+def bench_cipher():
+    """Сравнение посимвольной и векторной реализаций шифра"""
+    vigenere.vigenere_encrypt(make_text(100), KEY)  # Прогрев
+    header = ["Размер", "Операция", "Цикл, с", "NumPy, с", "Ускорение"]
+    print("{:>10} {:>12} {:>10} {:>10} {:>10}".format(*header))
+    for size in TEXT_SIZES:
+        text = make_text(size)
+        pairs = [
+            ("шифрование", reference_encrypt, vigenere.vigenere_encrypt, text),
+            ("дешифрование", reference_decrypt, vigenere.vigenere_decrypt, None),
+        ]
+        ciphertext = None
+        for name, reference, vectorized, source in pairs:
+            source = source if source is not None else ciphertext
+            ref_time, expected = measure(reference, source, KEY)
+            vec_time, result = measure(vectorized, source, KEY)
+            if result != expected:
+                raise AssertionError(f"Результаты не совпадают: {name}, {size}")
+            ciphertext = result
+            print(
+                f"{size:>10} {name:>12} {ref_time:>10.4f} {vec_time:>10.4f} "
+                f"{ref_time / vec_time:>9.1f}x"
+            )
+
+
+def import_time(module, repeats):
+    """Медиана времени запуска интерпретатора с импортом модуля (отдельный процесс)"""
+    command = [sys.executable, "-c", f"import {module}" if module else "pass"]
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter_ns()
+        subprocess.run(command, check=True)
+        timings.append((time.perf_counter_ns() - start) / 1e9)
+    return statistics.median(timings)
+
+
+def heaviest_imports(module, top):
+    """Самые дорогие вложенные импорты модуля по данным python -X importtime"""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    entries = []
+    # Строки вида "import time: self [us] | cumulative | <отступ>package"
+    for line in completed.stderr.splitlines()[1:]:
+        parts = line.partition(":")[2].split("|")
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            name = parts[2].strip()
+            depth = len(parts[2]) - len(parts[2].lstrip())
+            entries.append((name, depth, int(parts[1]) / 1e6))
+    # Модуль идёт последним, прямые импорты - на уровень вложенности глубже
+    module_depth = entries[-1][1]
+    cumulative = {
+        name: seconds for name, depth, seconds in entries if depth == module_depth + 2
+    }
+    return sorted(cumulative.items(), key=lambda item: -item[1])[:top]
+
+
+def bench_imports(modules, repeats):
+    """Время импорта точек входа сверх запуска пустого интерпретатора"""
+    baseline = import_time(None, repeats)
+    print(f"Запуск интерпретатора: {baseline:.4f} с")
+    print("{:>15} {:>10}  {}".format("Модуль", "Импорт, с", "Самые дорогие импорты"))
+    for module in modules:
+        elapsed = import_time(module, repeats) - baseline
+        heaviest = ", ".join(
+            f"{name} {seconds:.3f}" for name, seconds in heaviest_imports(module, 3)
+        )
+        print(f"{module:>15} {elapsed:>10.4f}  {heaviest}")
+
+
+def time_call(func, args, warmup, repeats):
+    """Времена repeats вызовов (монотонный таймер) после warmup прогревочных"""
+    for _ in range(warmup):
+        func(*args)
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter_ns()
+        func(*args)
+        timings.append((time.perf_counter_ns() - start) / 1e9)
+    return timings
+
+
+def summarize(timings):
+    """Статистика по списку времён"""
+    return {
+        "min_s": min(timings),
+        "median_s": statistics.median(timings),
+        "mean_s": statistics.fmean(timings),
+        "stdev_s": statistics.stdev(timings) if len(timings) > 1 else 0.0,
+        "repeats": len(timings),
+    }
+
+
+def make_key(distribution, length, seed):
+    """Воспроизводимый ключ из key_generator для заданного распределения"""
+    random.seed(seed)
+    np.random.seed(seed)
+    return SUITE_DISTRIBUTIONS[distribution](length)
+
+
+def suite_cases(sizes, key_lengths, distributions, operations, seed):
+    """Перечень измерений: (операция, параметры, функция, аргументы)"""
+    for size in sizes:
+        text = make_text(size)
+        if "clean_text" in operations:
+            yield "clean_text", {"size": size}, vigenere.clean_text, (text,)
+        if "refine_key" in operations or "candidate_keys" in operations:
+            model = ngram.NgramModel.from_corpus(text)
+        for distribution in distributions:
+            for key_length in key_lengths:
+                key = make_key(distribution, key_length, seed)
+                params = {
+                    "size": size,
+                    "key_length": key_length,
+                    "distribution": distribution,
+                }
+                ciphertext = vigenere.vigenere_encrypt(text, key)
+                calls = {
+                    "vigenere_encrypt": (vigenere.vigenere_encrypt, (text, key)),
+                    "vigenere_decrypt": (vigenere.vigenere_decrypt, (ciphertext, key)),
+                    "kasiski_examination": (
+                        cryptoanalysis.kasiski_examination,
+                        (ciphertext,),
+                    ),
+                    "frequency_attack": (
+                        cryptoanalysis.frequency_attack,
+                        (ciphertext, key_length),
+                    ),
+                }
+                if "refine_key" in operations:
+                    # Уточнение начинается с ключа частотного анализа
+                    start_key = cryptoanalysis.frequency_attack(ciphertext, key_length)
+                    calls["refine_key"] = (
+                        ngram.refine_key,
+                        (ciphertext, start_key, model),
+                    )
+                if "candidate_keys" in operations:
+                    calls["candidate_keys"] = (
+                        cryptoanalysis.candidate_keys,
+                        (ciphertext, key_length, cryptoanalysis.CANDIDATE_KEYS, model),
+                    )
+                for operation, (func, args) in calls.items():
+                    if operation in operations:
+                        yield operation, params, func, args
+
+
+def environment_info():
+    """Сведения об окружении для сравнения результатов между версиями"""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "timer": "time.perf_counter_ns",
+    }
+
+
+def run_suite(args):
+    """Набор бенчмарков горячих путей с выводом в JSON"""
+    results = []
+    cases = suite_cases(
+        args.sizes, args.key_lengths, args.distributions, args.operations, args.seed
+    )
+    for operation, params, func, call_args in cases:
+        timings = time_call(func, call_args, args.warmup, args.repeats)
+        record = {"operation": operation, **params, **summarize(timings)}
+        results.append(record)
+        print(
+            f"{operation:>20} {json.dumps(params, ensure_ascii=False):<60} "
+            f"{record['median_s']:.6f} с"
+        )
+
+    report = {
+        "environment": environment_info(),
+        "parameters": {
+            "warmup": args.warmup,
+            "repeats": args.repeats,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Результаты бенчмарков сохранены в {args.output}")
+
+
+def case_id(record):
+    """Ключ измерения для сопоставления двух отчётов"""
+    fields = ("operation", "size", "key_length", "distribution")
+    return tuple(record.get(field) for field in fields)
+
+
+def compare_reports(args):
+    """Сравнение двух JSON-отчётов: отношение медиан нового к старому"""
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = {case_id(r): r for r in json.load(f)["results"]}
+    with open(args.current, "r", encoding="utf-8") as f:
+        current = json.load(f)["results"]
+
+    regressions = 0
+    for record in current:
+        old = baseline.get(case_id(record))
+        if old is None:
+            continue
+        ratio = record["median_s"] / old["median_s"]
+        marker = ""
+        if ratio > 1 + args.threshold:
+            marker = "  <-- замедление"
+            regressions += 1
+        print(f"{str(case_id(record)):<70} {ratio:>6.2f}x{marker}")
+    print(f"Замедлений больше {args.threshold:.0%}: {regressions}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Бенчмарки шифра и атак")
+    commands = parser.add_subparsers(dest="command")
+
+    suite = commands.add_parser("suite", help="набор бенчмарков с выводом в JSON")
+    suite.add_argument("--sizes", type=int, nargs="+", default=SUITE_SIZES)
+    suite.add_argument("--key-lengths", type=int, nargs="+", default=SUITE_KEY_LENGTHS)
+    suite.add_argument(
+        "--distributions",
+        nargs="+",
+        choices=list(SUITE_DISTRIBUTIONS),
+        default=list(SUITE_DISTRIBUTIONS),
+    )
+    suite.add_argument(
+        "--operations",
+        nargs="+",
+        choices=SUITE_OPERATIONS,
+        default=SUITE_OPERATIONS,
+    )
+    suite.add_argument("--warmup", type=int, default=1)
+    suite.add_argument("--repeats", type=int, default=5)
+    suite.add_argument("--seed", type=int, default=0)
+    suite.add_argument("--output", default="benchmark_results.json")
+
+    compare = commands.add_parser("compare", help="сравнение двух JSON-отчётов")
+    compare.add_argument("baseline")
+    compare.add_argument("current")
+    compare.add_argument("--threshold", type=float, default=0.1)
+
+    commands.add_parser("cipher", help="цикл против NumPy для шифрования")
+
+    kasiski = commands.add_parser("kasiski", help="масштабирование метода Касиски")
+    kasiski.add_argument("max_size", type=int, nargs="?")
+
+    check = commands.add_parser(
+        "check", help="сравнение chi2 и метода Касиски с исходными реализациями"
+    )
+    check.add_argument("--seed", type=int, default=0)
+    check.add_argument("--cases", type=int, default=CHECK_RANDOM_CASES)
+
+    friedman = commands.add_parser("friedman", help="масштабирование метода Фридмана")
+    friedman.add_argument("max_size", type=int, nargs="?")
+
+    imports = commands.add_parser("imports", help="время импорта точек входа")
+    imports.add_argument("modules", nargs="*", default=ENTRY_POINT_MODULES)
+    imports.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args(argv)
+    if args.command is None:
+        # Без подкоманды запускается набор с параметрами по умолчанию
+        args = parser.parse_args(["suite"])
+    return args
+
+
+def main():
+    args = parse_args()
+    if args.command == "compare":
+        compare_reports(args)
+    elif args.command == "cipher":
+        bench_cipher()
+    elif args.command == "kasiski":
+        bench_kasiski(args.max_size)
+    elif args.command == "check":
+        check_reference(args.seed, args.cases)
+    elif args.command == "friedman":
+        bench_friedman(args.max_size)
+    elif args.command == "imports":
+        bench_imports(args.modules, args.repeats)
+    else:
+        run_suite(args)
+
+
+if __name__ == "__main__":
+    main()
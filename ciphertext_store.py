@@ -0,0 +1,132 @@
+import os
+
+import numpy as np
+
+import vigenere
+from language import CURRENT, DIGEST_SIZE
+from vigenere import N_LETTERS
+
+# Формат файла: заголовок MAGIC, отпечаток языка (DIGEST_SIZE байт), затем
+# индексы букв (по байту на букву). Индексы другого языка не открываются
+MAGIC = b"VGNIDX02"
+HEADER_SIZE = len(MAGIC) + DIGEST_SIZE
+
+# Наибольший период, для которого по умолчанию строятся гистограммы
+DEFAULT_MAX_PERIOD = 100
+
+# Суффикс файла кэша гистограмм рядом с файлом шифртекста (свой для языка)
+HISTOGRAM_SUFFIX = f".{CURRENT.name}.hist.npz"
+
+
+def write_encoded(path, chunks):
+    """Запись текста в файл индексов; chunks - строки или EncodedText
+
+    Текст обрабатывается порциями, поэтому подходит для потоков из
+    vigenere.encrypt_chunks. Возвращает число записанных букв.
+    """
+    written = 0
+    with open(path, "wb") as f:
+        f.write(MAGIC)
+        f.write(CURRENT.binary_digest())
+        for chunk in chunks:
+            indices = vigenere.as_encoded(chunk).indices
+            f.write(indices.tobytes())
+            written += len(indices)
+    return written
+
+
+def encode_file(source_path, path, chunk_size=vigenere.DEFAULT_CHUNK_SIZE):
+    """Очистка и кодирование текстового файла в файл индексов"""
+    with open(source_path, "r", encoding="utf-8") as f:
+        return write_encoded(path, vigenere.read_chunks(f, chunk_size))
+
+
+def open_encoded(path):
+    """Открытие файла индексов как EncodedText поверх memmap (без чтения в память)"""
+    with open(path, "rb") as f:
+        header = f.read(HEADER_SIZE)
+    if header[: len(MAGIC)] != MAGIC:
+        raise ValueError(f"{path} не является файлом индексов")
+    if header[len(MAGIC) :] != CURRENT.binary_digest():
+        raise ValueError(f"{path} записан для другого языка (текущий: {CURRENT.name})")
+    if os.path.getsize(path) == HEADER_SIZE:
+        return vigenere.EncodedText(np.zeros(0, dtype=np.uint8))
+    indices = np.memmap(path, dtype=np.uint8, mode="r", offset=HEADER_SIZE)
+    return vigenere.EncodedText(indices)
+
+
+class ColumnHistograms:
+    """Гистограммы букв по столбцам для всех периодов 1..max_period
+
+    Гистограммы хранятся одним массивом: строки периода p начинаются
+    с p * (p - 1) / 2, histograms[p] - массив (p, n).
+    """
+
+    def __init__(self, table, length):
+        self.table = table
+        self.length = length
+        # Число строк таблицы - max_period * (max_period + 1) / 2
+        self.max_period = int((np.sqrt(8 * len(table) + 1) - 1) // 2)
+
+    @staticmethod
+    def offset(period):
+        return period * (period - 1) // 2
+
+    def __getitem__(self, period):
+        if not 1 <= period <= self.max_period:
+            raise KeyError(period)
+        start = self.offset(period)
+        return self.table[start : start + period]
+
+    def __len__(self):
+        return self.max_period
+
+
+def compute_histograms(
+    encoded, max_period=DEFAULT_MAX_PERIOD, chunk_size=vigenere.DEFAULT_CHUNK_SIZE
+):
+    """Гистограммы всех периодов за один проход по тексту порциями"""
+    indices = vigenere.as_encoded(encoded).indices
+    rows = ColumnHistograms.offset(max_period + 1)
+    histograms = ColumnHistograms(np.zeros((rows, N_LETTERS), np.int64), len(indices))
+    for start in range(0, len(indices), chunk_size):
+        chunk = np.asarray(indices[start : start + chunk_size])
+        positions = np.arange(start, start + len(chunk))
+        for period in range(1, max_period + 1):
+            bins = positions % period
+            bins *= N_LETTERS
+            bins += chunk
+            counts = np.bincount(bins, minlength=period * N_LETTERS)
+            view = histograms[period]
+            view += counts.reshape(period, N_LETTERS)
+    return histograms
+
+
+def load_histograms(path, max_period=DEFAULT_MAX_PERIOD):
+    """Гистограммы столбцов файла индексов с кэшированием рядом с файлом
+
+    Кэш пересчитывается, если файл изменился, кэш построен для другого
+    языка или в нём меньше периодов, чем запрошено.
+    """
+    cache_path = path + HISTOGRAM_SUFFIX
+    mtime_ns = os.stat(path).st_mtime_ns
+    if os.path.exists(cache_path):
+        with np.load(cache_path) as cache:
+            histograms = ColumnHistograms(cache["histograms"], int(cache["length"]))
+            if (
+                int(cache["mtime_ns"]) == mtime_ns
+                and "language" in cache
+                and str(cache["language"]) == CURRENT.digest()
+                and histograms.max_period >= max_period
+            ):
+                return histograms
+
+    histograms = compute_histograms(open_encoded(path), max_period)
+    np.savez(
+        cache_path,
+        histograms=histograms.table,
+        length=histograms.length,
+        mtime_ns=mtime_ns,
+        language=CURRENT.digest(),
+    )
+    return histograms
@@ -1,117 +1,748 @@
-from collections import Counter
 import numpy as np
 
-# Улучшенные частоты букв в русском языке (в процентах)
-RUSSIAN_FREQ = {
-    "О": 10.97,
-    "Е": 8.45,
-    "А": 8.01,
-    "И": 7.35,
-    "Н": 6.70,
-    "Т": 6.26,
-    "С": 5.47,
-    "Р": 4.73,
-    "В": 4.54,
-    "Л": 4.40,
-    "К": 3.49,
-    "М": 3.21,
-    "Д": 2.98,
-    "П": 2.81,
-    "У": 2.62,
-    "Я": 2.01,
-    "Ы": 1.90,
-    "Ь": 1.74,
-    "Г": 1.70,
-    "З": 1.65,
-    "Б": 1.59,
-    "Ч": 1.44,
-    "Й": 1.21,
-    "Х": 0.97,
-    "Ж": 0.94,
-    "Ш": 0.73,
-    "Ю": 0.64,
-    "Ц": 0.48,
-    "Щ": 0.36,
-    "Э": 0.32,
-    "Ф": 0.26,
-    "Ъ": 0.04,
-}
+from language import CURRENT
+from profiling import instrumented
+from vigenere import ALPHABET, N_LETTERS, as_encoded, decode_indices
 
+# Ожидаемые частоты в порядке алфавита
+_EXPECTED_FREQ = CURRENT.tables.expected
 
+# Индекс совпадений текста на языке анализа и случайного текста
+LANGUAGE_IC = float(((_EXPECTED_FREQ / _EXPECTED_FREQ.sum()) ** 2).sum())
+RANDOM_IC = 1 / N_LETTERS
+
+# Уверенность по индексу совпадений, начиная с которой шифр считается шифром
+# Цезаря: у русского текста около 0.9, у ключей длины 2 - не больше 0.65
+MONOALPHABETIC_CONFIDENCE = 0.8
+# Минимальная длина шифртекста, с которой этой оценке можно верить без
+# проверки других длин ключа: на коротких текстах индекс совпадений шумит
+# (ключи длины 2-4 дают ложное срабатывание у 3% текстов из 100 букв)
+MONOALPHABETIC_MIN_LENGTH = 1000
+
+# Ожидаемая частота буквы расшифровки для буквы шифртекста c при сдвиге s:
+# _EXPECTED_BY_SHIFT[c, s] = частота буквы (c - s) mod n
+_EXPECTED_BY_SHIFT = _EXPECTED_FREQ[
+    (np.arange(N_LETTERS)[:, None] - np.arange(N_LETTERS)) % N_LETTERS
+]
+_INVERSE_EXPECTED_BY_SHIFT = 1 / _EXPECTED_BY_SHIFT
+
+# Сдвиги, chi2 которых больше наименьшего не более чем на это значение,
+# сравниваются в порядке вычислений исходной реализации (см. _break_ties)
+_TIE_TOLERANCE = 1e-6
+
+# Поиск по лучу: число сдвигов-кандидатов на столбец, ширина луча и число
+# возвращаемых ключей
+CANDIDATE_SHIFTS = 5
+BEAM_WIDTH = 32
+CANDIDATE_KEYS = 5
+# Вес средней log10-вероятности биграмм на стыке столбцов относительно chi2
+BIGRAM_WEIGHT = 1000.0
+
+
+# Длины повторяющихся последовательностей, которые ищет метод Касиски
+KASISKI_NGRAM_LENGTHS = (3, 4, 5)
+
+# Ограничение на размер вспомогательного массива счётчиков (элементов)
+_MAX_COUNTER_BINS = 1 << 22
+
+# Метод Фридмана: наибольший размер БПФ (элементов на порцию строк) и число
+# проходов гистограмм, которое стоит БПФ, на каждый бит его размера
+_MAX_FFT_ELEMENTS = 1 << 21
+_FFT_PERIODS_PER_LOG = 12
+
+
+def _position_buckets(indices, count):
+    """Порции позиций n-грамм: весь текст или, для больших текстов, по первой букве"""
+    if count <= _MAX_COUNTER_BINS:
+        yield np.arange(count)
+        return
+    for letter in range(N_LETTERS):
+        yield np.flatnonzero(indices[:count] == letter)
+
+
+def _ngram_codes(indices, positions, length):
+    """Коды n-грамм, упакованные по основанию n, для заданных позиций"""
+    codes = indices[positions].astype(np.int64)
+    for offset in range(1, length):
+        codes *= N_LETTERS
+        codes += indices[positions + offset]
+    return codes
+
+
+@instrumented("kasiski.ngram_groups")
+def _repeated_groups(indices, positions, length):
+    """Группировка позиций по одинаковым n-граммам сортировкой кодов
+
+    Возвращает позиции только повторяющихся n-грамм, упорядоченные по
+    группам (внутри группы - по возрастанию), номер группы для каждой
+    позиции и первую позицию каждой группы.
+    """
+    codes = _ngram_codes(indices, positions, length)
+    order = np.argsort(codes, kind="stable")
+    codes = codes[order]
+    positions = positions[order]
+
+    starts = np.flatnonzero(np.diff(codes, prepend=-1))
+    sizes = np.diff(starts, append=len(codes))
+    repeated = sizes > 1
+    group_sizes = sizes[repeated]
+    group_ids = np.repeat(np.arange(len(group_sizes)), group_sizes)
+    keep = np.repeat(repeated, sizes)
+    positions = positions[keep]
+    first_positions = positions[np.cumsum(group_sizes) - group_sizes]
+    return positions, group_ids, first_positions
+
+
+@instrumented("kasiski.factor_counting")
+def _pairs_per_group(positions, group_ids, n_groups, factor):
+    """Число пар позиций в каждой группе, расстояние между которыми кратно factor
+
+    Пары с расстоянием, кратным factor, - это пары с одинаковым остатком
+    от деления позиции на factor, поэтому достаточно посчитать остатки.
+    """
+    pairs = np.zeros(n_groups, dtype=np.int64)
+    groups_per_chunk = max(1, _MAX_COUNTER_BINS // factor)
+    for first in range(0, n_groups, groups_per_chunk):
+        last = min(first + groups_per_chunk, n_groups)
+        lo, hi = np.searchsorted(group_ids, [first, last])
+        bins = (group_ids[lo:hi] - first) * factor + positions[lo:hi] % factor
+        counts = np.bincount(bins, minlength=(last - first) * factor)
+        counts = counts * (counts - 1) // 2
+        pairs[first:last] = counts.reshape(-1, factor).sum(axis=1)
+    return pairs
+
+
+def _first_pair(indices, length, first_position, factor):
+    """Номера (i, j) первой пары вхождений n-граммы с расстоянием, кратным factor"""
+    count = len(indices) - length
+    gram = indices[first_position : first_position + length]
+    matches = np.ones(count, dtype=bool)
+    for offset in range(length):
+        matches &= indices[offset : offset + count] == gram[offset]
+    residues = np.flatnonzero(matches) % factor
+    _, first_seen, counts = np.unique(residues, return_index=True, return_counts=True)
+    i = first_seen[counts > 1].min()
+    j = i + 1 + np.flatnonzero(residues[i + 1 :] == residues[i])[0]
+    return int(i), int(j)
+
+
+@instrumented("kasiski_examination")
 def kasiski_examination(ciphertext, max_key_length=20):
-    """Определение длины ключа методом Касиски"""
-    sequences = {}
-    for length in range(3, 6):
-        for i in range(len(ciphertext) - length):
-            seq = ciphertext[i : i + length]
-            if seq in sequences:
-                sequences[seq].append(i)
-            else:
-                sequences[seq] = [i]
-
-    # Фильтрация последовательностей
-    repeats = {
-        seq: positions for seq, positions in sequences.items() if len(positions) > 1
-    }
-
-    # Вычисление расстояний
-    distances = []
-    for positions in repeats.values():
-        for i in range(len(positions)):
-            for j in range(i + 1, len(positions)):
-                distances.append(positions[j] - positions[i])
-
-    # Нахождение НОД расстояний
-    factors = Counter()
-    for dist in distances:
-        for i in range(2, min(dist, max_key_length) + 1):
-            if dist % i == 0:
-                factors[i] += 1
+    """Определение длины ключа методом Касиски
 
+    Повторы ищутся по целочисленным кодам n-грамм с группировкой сортировкой,
+    а делители расстояний считаются по остаткам позиций без построения списка
+    всех попарных расстояний. Для ограничения памяти позиции больших текстов
+    обрабатываются порциями по первой букве n-граммы.
+    """
+    indices = as_encoded(ciphertext).indices
+    factors = list(range(2, max_key_length + 1))
+    counts = dict.fromkeys(factors, 0)
+    # Первая группа (в порядке обхода исходного алгоритма), давшая делитель
+    first_hits = {}
+
+    for length in KASISKI_NGRAM_LENGTHS:
+        count = len(indices) - length
+        if count <= 0:
+            continue
+        for positions in _position_buckets(indices, count):
+            if len(positions) < 2:
+                continue
+            positions, group_ids, first_positions = _repeated_groups(
+                indices, positions, length
+            )
+            if len(first_positions) == 0:
+                continue
+            for factor in factors:
+                pairs = _pairs_per_group(
+                    positions, group_ids, len(first_positions), factor
+                )
+                hits = pairs > 0
+                if not hits.any():
+                    continue
+                counts[factor] += int(pairs.sum())
+                hit = (length, int(first_positions[hits].min()))
+                if factor not in first_hits or hit < first_hits[factor]:
+                    first_hits[factor] = hit
+
+    if not first_hits:
+        return [1]
+
+    # Порядок равных по частоте делителей совпадает с порядком их первого
+    # появления при переборе пар расстояний
+    def insertion_order(factor):
+        length, first_position = first_hits[factor]
+        pair = _first_pair(indices, length, first_position, factor)
+        return (length, first_position) + pair + (factor,)
+
+    ranked = sorted(first_hits, key=lambda f: (-counts[f], insertion_order(f)))
     # Возвращаем 3 наиболее вероятных длины
-    if factors:
-        return [length for length, _ in factors.most_common(3)]
-    return [1]
-
-
-def frequency_attack(ciphertext, key_length):
-    """Улучшенный частотный анализ с проверкой нескольких кандидатов"""
-    alphabet = "АБВГДЕЖЗИЙКЛМНОПРСТУФХЦЧШЩЪЫЬЭЮЯ"
-    n = len(alphabet)
-    char_to_index = {char: i for i, char in enumerate(alphabet)}
-    key = []
-
-    # Анализ каждого подблока
-    for i in range(key_length):
-        block = ciphertext[i::key_length]
-        if len(block) == 0:
-            key.append("А")
+    return ranked[:3]
+
+
+@instrumented("frequency_attack.histograms")
+def column_histograms(ciphertext, key_length):
+    """Гистограммы букв для каждого столбца: массив (key_length, n)"""
+    indices = as_encoded(ciphertext).indices
+    return _column_histograms(indices, np.arange(len(indices)), key_length)
+
+
+def _column_histograms(indices, positions, key_length):
+    """Гистограммы столбцов по заранее построенному массиву позиций"""
+    bins = positions % key_length
+    bins *= N_LETTERS
+    bins += indices
+    histograms = np.bincount(bins, minlength=key_length * N_LETTERS)
+    return histograms.reshape(key_length, N_LETTERS)
+
+
+@instrumented("frequency_attack.shift_scoring")
+def chi_squared_scores(histograms):
+    """Chi2 для всех сдвигов всех столбцов сразу: массив (столбцы, сдвиги)
+
+    При сдвиге s буква p расшифрованного столбца встречается столько же раз,
+    сколько буква (p + s) mod n шифртекста, поэтому гистограмма расшифровки -
+    это циклически повёрнутая гистограмма столбца.
+
+    Отсутствующие в столбце буквы в сумму не входят, поэтому для
+    наблюдаемых частот o (в процентах) сумма раскладывается как
+    sum(o^2 / e) - 2 * sum(o) + sum(e по встретившимся буквам), а обе суммы
+    по буквам для всех сдвигов сразу - произведения на матрицы (n, n).
+    """
+    histograms = np.asarray(histograms, dtype=np.float64)
+    totals = histograms.sum(axis=1, keepdims=True)
+    observed = histograms / np.maximum(totals, 1) * 100
+    scores = (observed**2) @ _INVERSE_EXPECTED_BY_SHIFT
+    scores += (histograms > 0) @ _EXPECTED_BY_SHIFT
+    # У пустого столбца все chi2 равны 0
+    scores -= np.where(totals > 0, 200.0, 0.0)
+    # Округление убирает ошибку порядка 1e-13 от перестановки слагаемых, чтобы
+    # равные chi2 разных сдвигов оставались равными (выбирается первый сдвиг)
+    return np.round(scores, 9)
+
+
+def index_of_coincidence(histograms):
+    """Индекс совпадений по набору столбцов (суммарно по всем столбцам)"""
+    totals = histograms.sum(axis=-1)
+    pairs = (histograms * (histograms - 1)).sum(axis=-1).sum(axis=-1)
+    return pairs / max(int((totals * (totals - 1)).sum()), 1)
+
+
+def is_monoalphabetic(ciphertext, threshold=MONOALPHABETIC_CONFIDENCE):
+    """Шифр с периодом 1 (Цезарь или тождественный ключ) по индексу совпадений
+
+    Проверка стоит одной гистограммы и позволяет не искать длину ключа.
+    """
+    histograms = column_histograms(ciphertext, 1)
+    if histograms.sum() < 2:
+        return False
+    ic = index_of_coincidence(histograms)
+    return bool((ic - RANDOM_IC) / (LANGUAGE_IC - RANDOM_IC) >= threshold)
+
+
+def _fft_size(size):
+    """Размер БПФ для автокорреляции без циклического переноса (не меньше 2 * size)"""
+    return 1 << (2 * size).bit_length()
+
+
+def _uses_coincidences(size, max_period):
+    """Выбор пути подсчёта пар для метода Фридмана
+
+    Гистограммы стоят max_period проходов по тексту, БПФ - около
+    _FFT_PERIODS_PER_LOG * log2(размер БПФ) таких проходов независимо от
+    max_period, но требует памяти порядка размера БПФ. Поэтому БПФ
+    используется лишь при большом числе периодов и умеренной длине текста.
+    """
+    fft_size = _fft_size(size)
+    return (
+        fft_size <= _MAX_FFT_ELEMENTS
+        and max_period > _FFT_PERIODS_PER_LOG * np.log2(fft_size)
+    )
+
+
+def _letter_coincidences(ciphertexts):
+    """Число совпадений букв на каждом расстоянии: массив (строки, длина текста)
+
+    Элемент [r, d] - число позиций i строки r, где буква i совпадает с
+    буквой i + d. Это сумма автокорреляций индикаторов букв, которые для
+    всех расстояний сразу считаются через БПФ.
+    """
+    rows, size = ciphertexts.shape
+    fft_size = _fft_size(size)
+    power = np.zeros((rows, fft_size // 2 + 1))
+    for letter in range(N_LETTERS):
+        spectrum = np.fft.rfft(ciphertexts == letter, n=fft_size, axis=1)
+        power += spectrum.real**2 + spectrum.imag**2
+    coincidences = np.fft.irfft(power, n=fft_size, axis=1)[:, :size]
+    return np.rint(coincidences).astype(np.int64)
+
+
+def _pairs_by_coincidences(ciphertexts, max_period):
+    """Упорядоченные пары одинаковых букв в столбцах: (строки, max_period)
+
+    Две позиции попадают в один столбец периода p, если расстояние между
+    ними кратно p, поэтому число пар - сумма совпадений на расстояниях,
+    кратных p. Строки обрабатываются порциями в пределах _MAX_FFT_ELEMENTS.
+    """
+    rows, size = ciphertexts.shape
+    periods = np.arange(1, max_period + 1)
+    # Расстояния, кратные каждому периоду, подряд: период p даёт (size - 1) // p
+    # расстояний (при max_period <= size // 2 хотя бы одно)
+    multiples = (size - 1) // periods
+    starts = np.cumsum(multiples) - multiples
+    lags = np.repeat(periods, multiples)
+    lags *= np.arange(len(lags)) - np.repeat(starts, multiples) + 1
+    pairs = np.zeros((rows, max_period), dtype=np.int64)
+    chunk = max(1, _MAX_FFT_ELEMENTS // _fft_size(size))
+    for first in range(0, rows, chunk):
+        coincidences = _letter_coincidences(ciphertexts[first : first + chunk])
+        pairs[first : first + chunk] = 2 * np.add.reduceat(
+            coincidences[:, lags], starts, axis=1
+        )
+    return pairs
+
+
+def _pairs_by_histograms(ciphertexts, max_period):
+    """Упорядоченные пары одинаковых букв в столбцах: (строки, max_period)
+
+    Гистограммы столбцов всех строк для одного периода строятся одним
+    вызовом bincount; сумма c(c-1) по буквам - число пар. Массив номеров
+    корзин выделяется один раз и переиспользуется для всех периодов.
+    """
+    rows, size = ciphertexts.shape
+    letters = ciphertexts.astype(np.intp)
+    positions = np.arange(size)
+    row_numbers = np.arange(rows)[:, None]
+    bins = np.empty((rows, size), dtype=np.intp)
+    pairs = np.zeros((rows, max_period), dtype=np.int64)
+    for period in range(1, max_period + 1):
+        columns = positions % period
+        columns *= N_LETTERS
+        np.add(letters, columns, out=bins)
+        bins += row_numbers * (period * N_LETTERS)
+        histograms = np.bincount(bins.ravel(), minlength=rows * period * N_LETTERS)
+        histograms = histograms.reshape(rows, -1)
+        pairs[:, period - 1] = np.einsum("ij,ij->i", histograms, histograms) - size
+    return pairs
+
+
+def _ic_confidence(ciphertexts, max_period):
+    """Уверенность метода Фридмана для каждой строки и периода: (строки, max_period + 1)
+
+    ciphertexts - матрица индексов (строки, длина текста). Пары одинаковых
+    букв в столбцах считаются по гистограммам или, при большом числе
+    периодов, по совпадениям букв на всех расстояниях (см. _uses_coincidences).
+    """
+    rows, size = ciphertexts.shape
+    if _uses_coincidences(size, max_period):
+        pairs = _pairs_by_coincidences(ciphertexts, max_period)
+    else:
+        pairs = _pairs_by_histograms(ciphertexts, max_period)
+    # Число пар позиций в столбцах
+    periods = np.arange(1, max_period + 1)
+    column_rows, longer = np.divmod(size, periods)
+    shorter = periods - longer
+    total_pairs = column_rows * (
+        longer * (column_rows + 1) + shorter * (column_rows - 1)
+    )
+    confidence = np.zeros((rows, max_period + 1))
+    ic = pairs / total_pairs
+    confidence[:, 1:] = (ic - RANDOM_IC) / (LANGUAGE_IC - RANDOM_IC)
+    return np.clip(confidence, 0.0, 1.0)
+
+
+def _explained_by_divisors(confidence, tolerance):
+    """Периоды, уверенность которых объясняется одним из их собственных делителей"""
+    max_period = confidence.shape[-1] - 1
+    divisor_confidence = np.full(confidence.shape, -np.inf)
+    for divisor in range(1, max_period // 2 + 1):
+        multiples = divisor_confidence[..., 2 * divisor :: divisor]
+        np.maximum(multiples, confidence[..., divisor, None], out=multiples)
+    return divisor_confidence >= confidence - tolerance
+
+
+@instrumented("friedman_examination")
+def friedman_examination(ciphertext, max_key_length=1000, top=3, tolerance=0.1):
+    """Определение длины ключа по индексу совпадений (метод Фридмана)
+
+    Для каждого периода до max_key_length строятся гистограммы столбцов и
+    вычисляется их индекс совпадений. Уверенность - положение индекса между
+    случайным текстом (0) и языком анализа (1). Кратные истинной длины
+    дают такую же уверенность, поэтому период отбрасывается, если у одного
+    из его делителей уверенность не ниже чем на tolerance.
+    Возвращает до top пар (длина, уверенность) по убыванию уверенности.
+    """
+    indices = as_encoded(ciphertext).indices
+    # В каждом столбце должно быть хотя бы две буквы
+    max_period = min(max_key_length, len(indices) // 2)
+    if max_period < 1:
+        return [(1, 0.0)]
+
+    confidence = _ic_confidence(indices[None, :], max_period)[0]
+    return _rank_periods(confidence, top, tolerance)
+
+
+def friedman_from_histograms(histograms, top=3, tolerance=0.1):
+    """Метод Фридмана по готовым гистограммам столбцов без повторного чтения текста
+
+    histograms[p] - гистограммы столбцов периода p, массив (p, n), для
+    p от 1 до len(histograms) (например, ciphertext_store.ColumnHistograms).
+    """
+    length = int(histograms[1].sum())
+    max_period = min(len(histograms), length // 2)
+    if max_period < 1:
+        return [(1, 0.0)]
+
+    confidence = np.zeros(max_period + 1)
+    for period in range(1, max_period + 1):
+        ic = index_of_coincidence(histograms[period])
+        confidence[period] = (ic - RANDOM_IC) / (LANGUAGE_IC - RANDOM_IC)
+    confidence = np.clip(confidence, 0.0, 1.0)
+    return _rank_periods(confidence, top, tolerance)
+
+
+def _rank_periods(confidence, top, tolerance):
+    """До top периодов по убыванию уверенности, без кратных более сильному делителю"""
+    explained = _explained_by_divisors(confidence, tolerance)
+    candidates = []
+    for period in np.argsort(-confidence[1:], kind="stable") + 1:
+        if explained[period]:
+            continue
+        candidates.append((int(period), float(confidence[period])))
+        if len(candidates) == top:
+            break
+    return candidates
+
+
+@instrumented("frequency_attack")
+def frequency_attack(
+    ciphertext, key_length, return_fitness=False, n_best=None, model=None
+):
+    """Улучшенный частотный анализ с проверкой нескольких кандидатов
+
+    С return_fitness=True возвращает пару (ключ, средний chi2 выбранных
+    сдвигов по столбцам) - чем меньше, тем правдоподобнее длина ключа.
+    С n_best возвращает до n_best лучших ключей поиском по лучу
+    (см. candidate_keys); model - модель n-грамм для оценки стыков столбцов.
+    """
+    if n_best is not None:
+        return candidate_keys(ciphertext, key_length, n_best, model)
+    histograms = column_histograms(ciphertext, key_length)
+    return key_from_histograms(histograms, return_fitness, ciphertext)
+
+
+def _reference_chi_squared(column, shift):
+    """Chi2 сдвига столбца с порядком операций над float исходной реализации
+
+    Слагаемые суммируются в порядке первого появления букв в столбце, как
+    при обходе Counter расшифрованного столбца.
+    """
+    letters, first_seen, counts = np.unique(
+        column, return_index=True, return_counts=True
+    )
+    order = np.argsort(first_seen)
+    total = len(column)
+    chi2 = 0
+    for letter, count in zip(letters[order].tolist(), counts[order].tolist()):
+        observed = count / total * 100
+        expected = float(_EXPECTED_FREQ[(letter - shift) % N_LETTERS])
+        chi2 += (observed - expected) ** 2 / expected
+    return chi2
+
+
+def _break_ties(scores, best_shifts, indices):
+    """Выбор среди почти равных chi2 так же, как в исходной реализации
+
+    Равные chi2 разных сдвигов (например, у столбца с равными долями букв)
+    исходная реализация различала по ошибкам округления своей суммы, поэтому
+    для таких столбцов chi2 близких к наименьшему сдвигов пересчитываются в
+    её порядке операций. Такие столбцы редки, остальные не пересчитываются.
+    """
+    key_length = len(scores)
+    limits = scores[np.arange(key_length), best_shifts] + _TIE_TOLERANCE
+    tied = np.count_nonzero(scores <= limits[:, None], axis=1) > 1
+    for column in np.flatnonzero(tied):
+        letters = indices[column::key_length]
+        if len(letters) == 0:
             continue
+        candidates = np.flatnonzero(scores[column] <= limits[column]).tolist()
+        best_shifts[column] = min(
+            candidates,
+            key=lambda shift: (_reference_chi_squared(letters, shift), shift),
+        )
+    return best_shifts
+
+
+def key_from_histograms(histograms, return_fitness=False, ciphertext=None):
+    """Ключ по гистограммам столбцов: сдвиг с наименьшим chi2 для каждого столбца
+
+    С ciphertext равные chi2 разрешаются как в исходной реализации (см.
+    _break_ties); без него выбирается первый из равных сдвигов.
+    """
+    scores = chi_squared_scores(histograms)
+    # У пустого столбца все chi2 равны 0, поэтому выбирается "А"
+    best_shifts = np.argmin(scores, axis=1)
+    if ciphertext is not None:
+        best_shifts = _break_ties(scores, best_shifts, as_encoded(ciphertext).indices)
+    key = "".join(ALPHABET[shift] for shift in best_shifts)
+    if return_fitness:
+        fitness = float(scores[np.arange(len(best_shifts)), best_shifts].mean())
+        return key, fitness
+    return key
+
+
+def top_shifts(histograms, k=CANDIDATE_SHIFTS):
+    """k сдвигов с наименьшим chi2 для каждого столбца: (сдвиги, chi2) формы (столбцы, k)
+
+    Сдвиги упорядочены по возрастанию chi2 (при равенстве - по номеру),
+    поэтому первый из них совпадает с выбором key_from_histograms.
+    """
+    scores = chi_squared_scores(histograms)
+    shifts = np.argsort(scores, axis=1, kind="stable")[:, : min(k, N_LETTERS)]
+    return shifts, np.take_along_axis(scores, shifts, axis=1)
+
+
+def adjacent_pair_histograms(ciphertext, key_length):
+    """Гистограммы пар соседних букв на стыках столбцов: массив (key_length, n, n)
+
+    Элемент [j, a, b] - число позиций столбца j с буквой a, за которой
+    следует буква b столбца (j + 1) mod key_length.
+    """
+    indices = as_encoded(ciphertext).indices
+    bins = np.arange(max(len(indices) - 1, 0)) % key_length
+    bins *= N_LETTERS
+    bins += indices[:-1]
+    bins *= N_LETTERS
+    bins += indices[1:]
+    histograms = np.bincount(bins, minlength=key_length * N_LETTERS**2)
+    return histograms.reshape(key_length, N_LETTERS, N_LETTERS)
+
+
+def transition_scores(pair_histograms, shifts, bigram_table):
+    """Средняя log-вероятность биграмм расшифровки на каждом стыке столбцов
+
+    Для стыка j и кандидатов i (столбец j) и i' (столбец j + 1) элемент
+    [j, i, i'] - среднее по парам стыка значение bigram_table (n * n
+    log-вероятностей, как ngram.NgramModel.tables[2]). Массив (столбцы, k, k).
+    """
+    table = np.asarray(bigram_table, dtype=np.float64).reshape(N_LETTERS, N_LETTERS)
+    key_length, k = shifts.shape
+    following = np.roll(shifts, -1, axis=0)
+    scores = np.zeros((key_length, k, k))
+    for column, pairs in enumerate(pair_histograms):
+        # Учитываются только встретившиеся пары букв шифртекста
+        first, second = np.nonzero(pairs)
+        counts = pairs[first, second]
+        if not len(counts):
+            continue
+        plain_first = (first - shifts[column][:, None]) % N_LETTERS
+        plain_second = (second - following[column][:, None]) % N_LETTERS
+        log_probs = table[plain_first[:, None, :], plain_second[None, :, :]]
+        scores[column] = log_probs @ counts / counts.sum()
+    return scores
+
+
+def beam_search_keys(
+    shifts,
+    scores,
+    n_best=CANDIDATE_KEYS,
+    beam_width=BEAM_WIDTH,
+    transitions=None,
+    weight=BIGRAM_WEIGHT,
+):
+    """Лучшие ключи из сдвигов-кандидатов столбцов поиском по лучу
+
+    shifts, scores - результат top_shifts. Оценка ключа - сумма chi2
+    выбранных сдвигов минус weight * transitions (см. transition_scores)
+    на всех стыках, делённая на длину ключа; меньше - лучше. Столбцы
+    добавляются по одному, и после каждого остаются beam_width лучших
+    префиксов, поэтому стоимость - O(длина * beam_width * k). Без
+    transitions оценка - средний chi2, а найденные ключи - точно n_best
+    лучших из кандидатов. Возвращает список пар (ключ, оценка).
+    """
+    key_length, k = shifts.shape
+    if key_length == 0:
+        return []
+    beam_width = max(beam_width, n_best)
+    # Луч хранит номера кандидатов выбранных сдвигов (столбцы 0..column)
+    choices = np.arange(k)[:, None]
+    fitness = scores[0].copy()
+    for column in range(1, key_length):
+        expanded = fitness[:, None] + scores[column]
+        if transitions is not None:
+            expanded -= weight * transitions[column - 1][choices[:, -1]]
+        best = np.argsort(expanded, axis=None, kind="stable")[:beam_width]
+        parents, candidates = np.divmod(best, k)
+        choices = np.column_stack([choices[parents], candidates])
+        fitness = expanded.ravel()[best]
+    if transitions is not None:
+        # Стык последнего столбца с первым при повторении ключа
+        fitness = fitness - weight * transitions[-1][choices[:, -1], choices[:, 0]]
+    order = np.argsort(fitness, kind="stable")[:n_best]
+    keys = shifts[np.arange(key_length), choices[order]]
+    return [
+        ("".join(ALPHABET[shift] for shift in key), float(total / key_length))
+        for key, total in zip(keys, fitness[order])
+    ]
+
+
+@instrumented("frequency_attack.beam_search")
+def candidate_keys(
+    ciphertext,
+    key_length,
+    n_best=CANDIDATE_KEYS,
+    model=None,
+    k=CANDIDATE_SHIFTS,
+    beam_width=BEAM_WIDTH,
+    weight=BIGRAM_WEIGHT,
+):
+    """До n_best ключей заданной длины по возрастанию оценки: список (ключ, оценка)
+
+    Из каждого столбца берутся k сдвигов с наименьшим chi2, а ключи
+    собираются поиском по лучу. С моделью n-грамм (ngram.NgramModel)
+    оценка учитывает и биграммы на стыках соседних столбцов: это
+    исправляет столбцы, где частотный анализ ошибся, по соседям.
+    """
+    histograms = column_histograms(ciphertext, key_length)
+    shifts, scores = top_shifts(histograms, k)
+    transitions = None
+    if model is not None:
+        pairs = adjacent_pair_histograms(ciphertext, key_length)
+        transitions = transition_scores(pairs, shifts, model.tables[2])
+    return beam_search_keys(shifts, scores, n_best, beam_width, transitions, weight)
+
+
+@instrumented("rank_key_lengths")
+def rank_key_lengths(ciphertext, key_lengths, tolerance=0.25):
+    """Отбор кандидатов длины ключа по chi2 без полного дешифрования
+
+    Для каждой длины ключ подбирается частотным анализом, а кандидаты
+    сравниваются по среднему chi2 столбцов. У неверной длины столбцы
+    смешивают разные сдвиги, а у кратной - короче и шумнее, поэтому в
+    обоих случаях chi2 выше. Возвращает список (длина, ключ, chi2) для
+    лучшего кандидата и тех, чей chi2 больше лучшего не более чем в
+    (1 + tolerance) раз, по возрастанию chi2.
+    """
+    ranked = []
+    for key_length in dict.fromkeys(key_lengths):
+        key, fitness = frequency_attack(ciphertext, key_length, return_fitness=True)
+        ranked.append((key_length, key, fitness))
+    ranked.sort(key=lambda candidate: candidate[2])
+    if not ranked:
+        return ranked
+    limit = ranked[0][2] * (1 + tolerance)
+    return [candidate for candidate in ranked if candidate[2] <= limit]
+
+
+def batch_result_dtype(max_key_length):
+    """Тип структурированного массива результатов attack_batch"""
+    return np.dtype(
+        [
+            ("key_length", np.int32),
+            ("found_length", np.int32),
+            ("found_key", f"U{max(max_key_length, 1)}"),
+            ("confidence", np.float64),
+            ("key_accuracy", np.float64),
+            ("text_accuracy", np.float64),
+        ]
+    )
+
+
+def _key_matrix(keys):
+    """Ключи в виде матрицы индексов, дополненной нулями, и массив их длин"""
+    encoded = [as_encoded(key).indices for key in keys]
+    lengths = np.array([len(key) for key in encoded], dtype=np.int64)
+    matrix = np.zeros((len(keys), max(lengths.max(initial=0), 1)), dtype=np.uint8)
+    for row, key in enumerate(encoded):
+        matrix[row, : len(key)] = key
+    return matrix, lengths
+
+
+def _tiled_keys(matrix, lengths, size):
+    """Ключи, повторённые до длины текста: матрица (ключи, size)"""
+    columns = np.arange(size) % np.maximum(lengths, 1)[:, None]
+    return np.take_along_axis(matrix, columns, axis=1)
+
+
+def _batch_frequency_attack(ciphertexts, lengths, width):
+    """Частотный анализ всех строк; строки с одинаковой длиной ключа - одним вызовом"""
+    rows, size = ciphertexts.shape
+    found = np.zeros((rows, width), dtype=np.uint8)
+    positions = np.arange(size)
+    for length in np.unique(lengths):
+        selected = np.flatnonzero(lengths == length)
+        row_offsets = np.arange(len(selected))[:, None]
+        bins = (row_offsets * length + positions % length) * N_LETTERS
+        bins += ciphertexts[selected]
+        histograms = np.bincount(
+            bins.ravel(), minlength=len(selected) * length * N_LETTERS
+        ).reshape(-1, N_LETTERS)
+        shifts = np.argmin(chi_squared_scores(histograms), axis=1)
+        found[selected, :length] = shifts.reshape(len(selected), length)
+    return found
+
+
+def _batch_key_accuracy(key_matrix, key_lengths, found, found_lengths):
+    """Векторный аналог main.compare_keys: совпадения на общей длине ключей"""
+    width = max(key_matrix.shape[1], found.shape[1])
+    keys = np.zeros((len(key_matrix), width), dtype=np.uint8)
+    keys[:, : key_matrix.shape[1]] = key_matrix
+    padded = np.zeros_like(keys)
+    padded[:, : found.shape[1]] = found
+    common = np.minimum(key_lengths, found_lengths)
+    in_common = np.arange(width) < common[:, None]
+    matches = np.count_nonzero((keys == padded) & in_common, axis=1)
+    return np.where(common > 0, matches / np.maximum(common, 1) * 100, 0.0)
+
+
+@instrumented("attack_batch")
+def attack_batch(plaintext, keys, max_key_length=100, block_elements=1 << 23):
+    """Пакетная атака на набор ключей без поштучного цикла по ключам
+
+    Открытый текст кодируется один раз, шифртексты блока ключей строятся
+    как матрица индексов (ключи, длина текста). Длина ключа каждой строки
+    оценивается методом Фридмана, ключ - частотным анализом, а точность
+    расшифровки считается сравнением повторённых ключей без дешифрования.
+    block_elements ограничивает размер матрицы одного блока.
+    Возвращает структурированный массив (см. batch_result_dtype).
+    """
+    plain = as_encoded(plaintext).indices
+    size = len(plain)
+    key_matrix, key_lengths = _key_matrix(keys)
+    results = np.zeros(len(keys), dtype=batch_result_dtype(max_key_length))
+    results["key_length"] = key_lengths
+    max_period = min(max_key_length, size // 2)
+    if max_period < 1:
+        return results
+
+    rows_per_block = max(1, block_elements // size)
+    for first in range(0, len(keys), rows_per_block):
+        block = slice(first, min(first + rows_per_block, len(keys)))
+        tiled = _tiled_keys(key_matrix[block], key_lengths[block], size)
+        ciphertexts = np.add(plain, tiled)
+        np.remainder(ciphertexts, N_LETTERS, out=ciphertexts)
+
+        # Лучший период строки - с наибольшей уверенностью среди не кратных
+        confidence = _ic_confidence(ciphertexts, max_period)
+        explained = _explained_by_divisors(confidence, 0.1)
+        scores = np.where(explained, -1.0, confidence)
+        scores[:, 0] = -np.inf
+        lengths = np.argmax(scores, axis=1)
+
+        found = _batch_frequency_attack(ciphertexts, lengths, max_period)
+        found_tiled = _tiled_keys(found, lengths, size)
 
-        best_candidates = []
-        # Перебор всех возможных сдвигов
-        for shift in range(n):
-            decrypted = []
-            for c in block:
-                c_idx = char_to_index[c]
-                p_idx = (c_idx - shift) % n
-                decrypted.append(alphabet[p_idx])
-            decrypted_str = "".join(decrypted)
-
-            # Расчет частот
-            freq = Counter(decrypted_str)
-            total = len(decrypted_str)
-            chi2 = 0
-            for char, count in freq.items():
-                observed = count / total * 100
-                expected = RUSSIAN_FREQ.get(char, 0.01)
-                chi2 += (observed - expected) ** 2 / expected
-
-            best_candidates.append((shift, chi2))
-
-        # Выбор лучших кандидатов (3 с наименьшим chi2)
-        best_candidates.sort(key=lambda x: x[1])
-        best_shift = best_candidates[0][0]
-        key.append(alphabet[best_shift])
-
-    return "".join(key)
+        block_results = results[block]
+        block_results["found_length"] = lengths
+        block_results["confidence"] = confidence[np.arange(len(lengths)), lengths]
+        block_results["found_key"] = [
+            decode_indices(row[:length]) for row, length in zip(found, lengths)
+        ]
+        block_results["key_accuracy"] = _batch_key_accuracy(
+            key_matrix[block], key_lengths[block], found, lengths
+        )
+        block_results["text_accuracy"] = (
+            np.count_nonzero(found_tiled == tiled, axis=1) / size * 100
+        )
+        results[block] = block_results
+    return results
@@ -0,0 +1,235 @@
+import argparse
+import asyncio
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import main
+import vigenere
+
+# Протокол: клиент отправляет одну строку JSON {"corpus": путь, "keys": [...]},
+# сервис отвечает строкой JSON на каждый ключ по мере готовности
+# ({"index": номер ключа в задании, "result": ...}) и завершающей {"done": число}
+DEFAULT_SOCKET = "vigenere_jobs.sock"
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+# Наибольшая длина строки протокола (у клиента и сервиса одна и та же)
+LINE_LIMIT = 1 << 24
+
+# Закодированные корпуса в процессе-обработчике: (путь, mtime) -> EncodedText
+_worker_corpora = {}
+
+
+def _worker_corpus(path, mtime_ns):
+    """Корпус из кэша процесса; файл перечитывается, только если изменился"""
+    corpus = _worker_corpora.get((path, mtime_ns))
+    if corpus is None:
+        with open(path, "r", encoding="utf-8") as f:
+            corpus = vigenere.EncodedText.from_text(f.read())
+        # Старые версии того же файла больше не нужны
+        for cached in [cached for cached in _worker_corpora if cached[0] == path]:
+            del _worker_corpora[cached]
+        _worker_corpora[(path, mtime_ns)] = corpus
+    return corpus
+
+
+def _warm_up():
+    """Пустое задание: заставляет пул запустить процесс-обработчик"""
+    return os.getpid()
+
+
+def _analyze_in_worker(path, mtime_ns, key):
+    return main.process_key(_worker_corpus(path, mtime_ns), main.describe_key(key))
+
+
+class JobService:
+    """Сервис заданий (корпус, ключи) с постоянным пулом процессов
+
+    Процессы пула живут между заданиями и хранят закодированные корпуса,
+    поэтому задание не платит за запуск Python, импорт NumPy и очистку
+    текста. Результаты отправляются клиенту по мере готовности.
+    """
+
+    def __init__(self, workers=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.executor = ProcessPoolExecutor(max_workers=self.workers)
+
+    async def start(self):
+        """Запуск всех процессов пула до приёма соединений
+
+        Пул запускает процессы лениво, при первой задаче. Запущенный внутри
+        handle процесс унаследовал бы дескриптор сокета клиента, и после
+        writer.close() клиент не получил бы конец потока.
+        """
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(
+            *(
+                loop.run_in_executor(self.executor, _warm_up)
+                for _ in range(self.workers)
+            )
+        )
+
+    async def handle(self, reader, writer):
+        try:
+            request = json.loads(await reader.readline())
+            if not isinstance(request, dict):
+                raise TypeError("задание должно быть объектом JSON")
+            keys = request["keys"]
+            if not isinstance(keys, list) or not all(
+                isinstance(key, str) for key in keys
+            ):
+                raise TypeError("ключи должны быть списком строк")
+            keys = [key for key in keys if key]
+            path = os.path.abspath(request["corpus"])
+            mtime_ns = os.stat(path).st_mtime_ns
+        except (ValueError, KeyError, TypeError, OSError) as e:
+            await self._send(writer, {"error": f"Неверное задание: {e}"})
+            writer.close()
+            return
+
+        loop = asyncio.get_running_loop()
+        tasks = [
+            asyncio.ensure_future(
+                self._indexed(
+                    index,
+                    loop.run_in_executor(
+                        self.executor, _analyze_in_worker, path, mtime_ns, key
+                    ),
+                )
+            )
+            for index, key in enumerate(keys)
+        ]
+        try:
+            for future in asyncio.as_completed(tasks):
+                index, result = await future
+                await self._send(writer, {"index": index, "result": result})
+            await self._send(writer, {"done": len(keys)})
+        except ConnectionError:
+            # Клиент отключился: оставшиеся ключи ему больше не нужны
+            self._cancel(tasks)
+        except Exception as e:
+            # Ошибка обработчика: задание прерывается, клиент получает сообщение
+            self._cancel(tasks)
+            try:
+                await self._send(writer, {"error": f"Ошибка обработки: {e!r}"})
+            except ConnectionError:
+                pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    def _cancel(tasks):
+        for task in tasks:
+            task.cancel()
+
+    @staticmethod
+    async def _indexed(index, future):
+        return index, await future
+
+    @staticmethod
+    async def _send(writer, message):
+        writer.write((json.dumps(message, ensure_ascii=False) + "\n").encode("utf-8"))
+        await writer.drain()
+
+    def close(self):
+        self.executor.shutdown(cancel_futures=True)
+
+
+async def serve(socket_path=None, host=DEFAULT_HOST, port=DEFAULT_PORT, workers=None):
+    """Запуск сервиса на Unix-сокете (если задан socket_path) или на localhost"""
+    service = JobService(workers)
+    await service.start()
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        server = await asyncio.start_unix_server(
+            service.handle, path=socket_path, limit=LINE_LIMIT
+        )
+        print(f"Сервис заданий слушает {socket_path}")
+    else:
+        server = await asyncio.start_server(
+            service.handle, host, port, limit=LINE_LIMIT
+        )
+        print(f"Сервис заданий слушает {host}:{port}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+
+async def submit(
+    corpus,
+    keys,
+    socket_path=None,
+    host=DEFAULT_HOST,
+    port=DEFAULT_PORT,
+    limit=LINE_LIMIT,
+):
+    """Отправка задания; асинхронно выдаёт ответы сервиса по мере готовности
+
+    Путь к корпусу передаётся абсолютным: сервис работает в своём каталоге.
+    """
+    if socket_path:
+        reader, writer = await asyncio.open_unix_connection(socket_path, limit=limit)
+    else:
+        reader, writer = await asyncio.open_connection(host, port, limit=limit)
+    request = {"corpus": os.path.abspath(corpus), "keys": list(keys)}
+    writer.write((json.dumps(request, ensure_ascii=False) + "\n").encode("utf-8"))
+    await writer.drain()
+    try:
+        while line := await reader.readline():
+            message = json.loads(line)
+            yield message
+            # Завершающее сообщение: дальше сервис ничего не отправит
+            if "done" in message or "error" in message:
+                break
+    finally:
+        writer.close()
+
+
+async def _print_job(args):
+    keys = list(args.keys)
+    if args.keys_file:
+        with open(args.keys_file, "r", encoding="utf-8") as f:
+            keys.extend(line.strip() for line in f if line.strip())
+    async for message in submit(args.corpus, keys, args.socket, args.host, args.port):
+        print(json.dumps(message, ensure_ascii=False))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Сервис заданий анализа шифра Виженера"
+    )
+    parser.add_argument(
+        "--socket",
+        metavar="PATH",
+        help=f"Unix-сокет (например, {DEFAULT_SOCKET}); без него - TCP на localhost",
+    )
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = commands.add_parser("serve", help="запуск сервиса")
+    serve_parser.add_argument("--workers", type=int)
+
+    submit_parser = commands.add_parser("submit", help="отправка задания")
+    submit_parser.add_argument("--corpus", default="input.txt")
+    submit_parser.add_argument("--keys-file", metavar="FILE")
+    submit_parser.add_argument("keys", nargs="*")
+    return parser.parse_args(argv)
+
+
+def run():
+    args = parse_args()
+    if args.command == "serve":
+        try:
+            asyncio.run(serve(args.socket, args.host, args.port, args.workers))
+        except KeyboardInterrupt:
+            pass
+    else:
+        asyncio.run(_print_job(args))
+
+
+if __name__ == "__main__":
+    run()
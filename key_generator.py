@@ -1,10 +1,13 @@
+import argparse
 import random
 import math
 import sys
 from pathlib import Path
 
-# Русский алфавит (33 буквы)
-alphabet = "АБВГДЕЖЗИЙКЛМНОПРСТУФХЦЧШЩЪЫЬЭЮЯ"
+from language import CURRENT
+
+# Алфавит языка анализа (общий с vigenere и cryptoanalysis)
+alphabet = CURRENT.alphabet
 n_letters = len(alphabet)
 
 # Проверка наличия NumPy для биномиального и пуассоновского распределений
@@ -89,8 +92,114 @@ def save_key_to_file(key: str, filename: str):
         print(f"Ошибка при сохранении ключа: {e}")
 
 
+# Параметры распределений по умолчанию совпадают с generate_*
+def _sample_uniform(rng, size):
+    return rng.integers(n_letters, size=size)
+
+
+def _sample_normal(rng, size, mu=16.0, sigma=5.0):
+    return np.rint(rng.normal(mu, sigma, size)).astype(np.int64)
+
+
+def _sample_binomial(rng, size, n=32, p=0.5):
+    return rng.binomial(n, p, size)
+
+
+def _sample_poisson(rng, size, lam=16.0):
+    return rng.poisson(lam, size)
+
+
+def _sample_gamma(rng, size, alpha=9.0, beta=2.0):
+    return np.rint(rng.gamma(alpha, beta, size)).astype(np.int64)
+
+
+SAMPLERS = {
+    "uniform": _sample_uniform,
+    "normal": _sample_normal,
+    "binomial": _sample_binomial,
+    "poisson": _sample_poisson,
+    "gamma": _sample_gamma,
+}
+
+
+def generate_keys(
+    count: int, lengths: list, distributions: list = None, seed: int = None
+) -> list:
+    """Пакетная генерация: count ключей для каждой пары (распределение, длина)
+
+    Для каждого распределения все буквы всех ключей берутся одним вызовом
+    numpy.random.Generator, инициализированного seed. Ключи идут по
+    распределениям, внутри - по длинам.
+    """
+    if not has_numpy:
+        raise RuntimeError("Для пакетной генерации ключей нужен NumPy")
+    if distributions is None:
+        distributions = list(SAMPLERS)
+    rng = np.random.default_rng(seed)
+    codes = np.array([ord(char) for char in alphabet], dtype="<u4")
+    newline = np.full((count, 1), ord("\n"), dtype="<u4")
+
+    keys = []
+    for distribution in distributions:
+        samples = SAMPLERS[distribution](rng, count * sum(lengths)) % n_letters
+        offset = 0
+        for length in lengths:
+            block = samples[offset : offset + count * length].reshape(count, length)
+            offset += count * length
+            # Все ключи блока декодируются в одну строку через коды символов
+            text = np.hstack([codes[block], newline]).tobytes().decode("utf-32-le")
+            keys.extend(text.splitlines())
+    return keys
+
+
+def save_keys_to_file(keys: list, filename: str, append: bool = True):
+    """Сохраняет ключи в файл одной записью (по ключу на строку)"""
+    with open(filename, "a" if append else "w", encoding="utf-8") as f:
+        f.write("".join(key + "\n" for key in keys))
+
+
+def _positive_int(value: str) -> int:
+    """Тип аргумента argparse: целое число не меньше 1"""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"ожидается число не меньше 1: {value}")
+    return number
+
+
+def bulk_main(argv: list):
+    """Неинтерактивная пакетная генерация ключей в файл"""
+    parser = argparse.ArgumentParser(description="Пакетная генерация ключей")
+    parser.add_argument(
+        "--count",
+        type=_positive_int,
+        required=True,
+        help="число ключей для каждой пары (распределение, длина)",
+    )
+    parser.add_argument("--lengths", type=_positive_int, nargs="+", required=True)
+    parser.add_argument(
+        "--distributions", nargs="+", choices=list(SAMPLERS), default=list(SAMPLERS)
+    )
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--output", default="keys.txt")
+    parser.add_argument(
+        "--overwrite",
+        action="store_true",
+        help="перезаписать файл вместо дописывания в конец",
+    )
+    args = parser.parse_args(argv)
+
+    keys = generate_keys(args.count, args.lengths, args.distributions, args.seed)
+    save_keys_to_file(keys, args.output, append=not args.overwrite)
+    print(f"Сохранено ключей: {len(keys)} в файл {args.output}")
+
+
 def main():
     """Основная функция программы"""
+    # С аргументами командной строки - пакетный режим без вопросов
+    if len(sys.argv) > 1:
+        bulk_main(sys.argv[1:])
+        return
+
     print("Генератор ключей для шифра Виженера")
     print("Доступные распределения:")
     print("1 - Нормальное")
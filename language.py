@@ -0,0 +1,268 @@
+import hashlib
+import json
+import os
+from collections import Counter
+
+# Алфавит и частоты доступны и без NumPy (нужен только для таблиц)
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Признак символа, не являющегося буквой алфавита
+NOT_A_LETTER = 255
+
+# Частота буквы, отсутствующей в таблице частот (в процентах)
+MISSING_FREQUENCY = 0.01
+
+# Скомпилированные таблицы хранятся рядом с байт-кодом модулей. Формат файла:
+# MAGIC, размеры таблицы перекодировки и алфавита (int64), затем сами массивы
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "__pycache__")
+MAGIC = b"VGNLNG01"
+
+_MAX_CODE_POINT = 0x110000
+
+# Размер двоичного отпечатка языка в заголовках файлов данных (байт)
+DIGEST_SIZE = 16
+
+# Переменная окружения с языком анализа: имя встроенного языка или путь к
+# JSON-описанию (см. load_language)
+LANGUAGE_ENV = "VIGENERE_LANGUAGE"
+DEFAULT_LANGUAGE = "russian"
+
+
+class LanguageTables:
+    """Скомпилированные таблицы языка (непрерывные массивы NumPy)
+
+    lookup[код символа] - индекс буквы или NOT_A_LETTER; последний элемент -
+    "заглушка" для всех символов за пределами таблицы. letter_codes - коды
+    букв в порядке алфавита, expected - частоты букв в процентах.
+    """
+
+    def __init__(self, lookup, letter_codes, expected):
+        self.lookup = lookup
+        self.letter_codes = letter_codes
+        self.expected = expected
+
+
+def _write_tables(path, tables):
+    # Запись во временный файл и переименование: параллельные процессы
+    # никогда не читают недописанный файл
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "wb") as f:
+        f.write(MAGIC)
+        f.write(np.array([len(tables.lookup), len(tables.letter_codes)], "<i8"))
+        f.write(tables.lookup.astype(np.uint8).tobytes())
+        f.write(tables.letter_codes.astype("<u4").tobytes())
+        f.write(tables.expected.astype("<f8").tobytes())
+    os.replace(temporary, path)
+
+
+def _read_tables(path):
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} не является файлом таблиц языка")
+        lookup_size, letters = np.frombuffer(f.read(16), "<i8")
+        lookup = np.frombuffer(f.read(int(lookup_size)), np.uint8)
+        letter_codes = np.frombuffer(f.read(int(letters) * 4), "<u4")
+        expected = np.frombuffer(f.read(int(letters) * 8), "<f8")
+    if len(lookup) != lookup_size or len(expected) != letters:
+        raise ValueError(f"Файл таблиц языка {path} повреждён")
+    return LanguageTables(lookup, letter_codes, expected)
+
+
+class Language:
+    """Алфавит и частоты букв языка
+
+    folds - замены букв при очистке (например, Ё -> Е). Таблицы для быстрых
+    путей компилируются при первом обращении и кэшируются в двоичном файле.
+    """
+
+    def __init__(self, name, alphabet, frequencies, folds=None):
+        if len(alphabet) >= NOT_A_LETTER:
+            raise ValueError(f"В алфавите должно быть меньше {NOT_A_LETTER} букв")
+        self.name = name
+        self.alphabet = alphabet
+        self.frequencies = dict(frequencies)  # буква -> частота в процентах
+        self.folds = dict(folds or {})
+        self._tables = None
+
+    @classmethod
+    def from_corpus(cls, name, alphabet, text, folds=None):
+        """Язык с частотами букв, посчитанными по эталонному тексту"""
+        folds = dict(folds or {})
+        letters = set(alphabet)
+        counts = Counter(folds.get(char, char) for char in text.upper())
+        total = sum(counts[char] for char in letters) or 1
+        frequencies = {
+            char: counts[char] / total * 100 for char in alphabet if counts[char]
+        }
+        return cls(name, alphabet, frequencies, folds)
+
+    def __len__(self):
+        return len(self.alphabet)
+
+    def __repr__(self):
+        return f"Language({self.name!r}, {len(self)} букв)"
+
+    def digest(self):
+        """Хэш определения языка: меняется вместе с алфавитом, частотами и заменами"""
+        definition = repr(
+            (
+                MAGIC,
+                self.alphabet,
+                sorted(self.frequencies.items()),
+                sorted(self.folds.items()),
+            )
+        )
+        return hashlib.sha256(definition.encode("utf-8")).hexdigest()
+
+    def binary_digest(self):
+        """Первые DIGEST_SIZE байт хэша определения для заголовков двоичных файлов"""
+        return bytes.fromhex(self.digest())[:DIGEST_SIZE]
+
+    @property
+    def tables(self):
+        if np is None:
+            raise RuntimeError("Для таблиц языка нужен NumPy")
+        if self._tables is None:
+            self._tables = self._load_tables()
+        return self._tables
+
+    def cache_path(self):
+        return os.path.join(CACHE_DIR, f"language-{self.name}-{self.digest()[:16]}.bin")
+
+    def _load_tables(self):
+        path = self.cache_path()
+        try:
+            return _read_tables(path)
+        except (OSError, ValueError):
+            pass
+        tables = self.compile()
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            _write_tables(path, tables)
+        except OSError:
+            pass  # Без кэша таблицы компилируются при каждом запуске
+        return tables
+
+    def compile(self):
+        """Построение таблиц перебором всех символов Unicode"""
+        char_to_index = {char: i for i, char in enumerate(self.alphabet)}
+        mapped = {}
+        for code in range(_MAX_CODE_POINT):
+            upper = chr(code).upper()
+            upper = self.folds.get(upper, upper)
+            if len(upper) == 1 and upper in char_to_index:
+                mapped[code] = char_to_index[upper]
+        size = max(mapped, default=-1) + 1
+        lookup = np.full(size + 1, NOT_A_LETTER, dtype=np.uint8)
+        lookup[list(mapped)] = list(mapped.values())
+        letter_codes = np.array([ord(char) for char in self.alphabet], dtype="<u4")
+        expected = np.array(
+            [self.frequencies.get(char, MISSING_FREQUENCY) for char in self.alphabet]
+        )
+        return LanguageTables(lookup, letter_codes, expected)
+
+
+# Улучшенные частоты букв в русском языке (в процентах)
+RUSSIAN_FREQ = {
+    "О": 10.97,
+    "Е": 8.45,
+    "А": 8.01,
+    "И": 7.35,
+    "Н": 6.70,
+    "Т": 6.26,
+    "С": 5.47,
+    "Р": 4.73,
+    "В": 4.54,
+    "Л": 4.40,
+    "К": 3.49,
+    "М": 3.21,
+    "Д": 2.98,
+    "П": 2.81,
+    "У": 2.62,
+    "Я": 2.01,
+    "Ы": 1.90,
+    "Ь": 1.74,
+    "Г": 1.70,
+    "З": 1.65,
+    "Б": 1.59,
+    "Ч": 1.44,
+    "Й": 1.21,
+    "Х": 0.97,
+    "Ж": 0.94,
+    "Ш": 0.73,
+    "Ю": 0.64,
+    "Ц": 0.48,
+    "Щ": 0.36,
+    "Э": 0.32,
+    "Ф": 0.26,
+    "Ъ": 0.04,
+}
+
+# Русский алфавит (Ё заменяется на Е при очистке)
+RUSSIAN = Language(
+    "russian", "АБВГДЕЖЗИЙКЛМНОПРСТУФХЦЧШЩЪЫЬЭЮЯ", RUSSIAN_FREQ, {"Ё": "Е"}
+)
+
+# Частоты букв в английском языке (в процентах)
+ENGLISH_FREQ = {
+    "E": 12.70,
+    "T": 9.06,
+    "A": 8.17,
+    "O": 7.51,
+    "I": 6.97,
+    "N": 6.75,
+    "S": 6.33,
+    "H": 6.09,
+    "R": 5.99,
+    "D": 4.25,
+    "L": 4.03,
+    "C": 2.78,
+    "U": 2.76,
+    "M": 2.41,
+    "W": 2.36,
+    "F": 2.23,
+    "G": 2.02,
+    "Y": 1.97,
+    "P": 1.93,
+    "B": 1.29,
+    "V": 0.98,
+    "K": 0.77,
+    "J": 0.15,
+    "X": 0.15,
+    "Q": 0.10,
+    "Z": 0.07,
+}
+
+ENGLISH = Language("english", "ABCDEFGHIJKLMNOPQRSTUVWXYZ", ENGLISH_FREQ)
+
+# Встроенные языки по имени
+LANGUAGES = {language.name: language for language in (RUSSIAN, ENGLISH)}
+
+
+def load_language(spec):
+    """Язык по имени встроенного языка или по пути к JSON-описанию
+
+    Описание: {"name", "alphabet", "folds" (необязательно)} и либо
+    "frequencies" (буква -> частота в процентах), либо "corpus" - путь к
+    эталонному тексту (относительно файла описания), по которому частоты
+    считаются через Language.from_corpus.
+    """
+    if spec in LANGUAGES:
+        return LANGUAGES[spec]
+    with open(spec, "r", encoding="utf-8") as f:
+        definition = json.load(f)
+    name, alphabet = definition["name"], definition["alphabet"]
+    folds = definition.get("folds")
+    if "frequencies" in definition:
+        return Language(name, alphabet, definition["frequencies"], folds)
+    corpus_path = os.path.join(os.path.dirname(spec), definition["corpus"])
+    with open(corpus_path, "r", encoding="utf-8") as f:
+        return Language.from_corpus(name, alphabet, f.read(), folds)
+
+
+# Язык анализа выбирается один раз при запуске: модули конвейера строят по
+# нему свои таблицы при импорте, а процессы-обработчики наследуют окружение
+CURRENT = load_language(os.environ.get(LANGUAGE_ENV, DEFAULT_LANGUAGE))
@@ -1,11 +1,19 @@
 import vigenere
 import cryptoanalysis
+import language
+import metrics
+import profiling
+import result_cache
+import results_io
+import text_cleaning
+import argparse
+import cProfile
 import os
 import time
 import numpy as np
-import matplotlib.pyplot as plt
 from collections import Counter
 import math
+import tracemalloc
 
 
 # Функция для вычисления энтропии ключа
@@ -43,17 +51,278 @@ def detect_key_distribution(key):
 
 # Функция для сравнения ключей
 def compare_keys(original, found):
-    if len(original) == 0 or len(found) == 0:
-        return 0.0
+    return metrics.key_accuracy(original, found)
+
+
+def describe_key(key):
+    """Характеристики ключа для анализа и отчёта"""
+    return {
+        "key": key,
+        "length": len(key),
+        "entropy": calculate_entropy(key),
+        "distribution": detect_key_distribution(key),
+    }
 
-    min_len = min(len(original), len(found))
-    matches = sum(1 for i in range(min_len) if original[i] == found[i])
-    return matches / min_len * 100
+
+def analyze_key(encoded_plaintext, key_info):
+    """Шифрование, атака и оценка точности для одного ключа"""
+    key = key_info["key"]
+
+    # Периодичный ключ шифрует так же, как его минимальный период
+    with profiling.stage("main.key_reduction", len(key)):
+        primitive_key = vigenere.primitive_key(key)
+
+    # Шифрование
+    start_time = time.time()
+    with profiling.stage("main.encrypt", len(encoded_plaintext)):
+        ciphertext = vigenere.vigenere_encrypt(encoded_plaintext, primitive_key)
+    encrypt_time = time.time() - start_time
+
+    # Атака
+    start_time = time.time()
+    with profiling.stage("main.key_length", len(ciphertext)):
+        # Шифр Цезаря виден по индексу совпадений: на длинном тексте поиск
+        # длины не нужен, на коротком длина 1 лишь добавляется к кандидатам
+        monoalphabetic = cryptoanalysis.is_monoalphabetic(ciphertext)
+        if (
+            monoalphabetic
+            and len(ciphertext) >= cryptoanalysis.MONOALPHABETIC_MIN_LENGTH
+        ):
+            key_length_candidates = [1]
+        else:
+            key_length_candidates = cryptoanalysis.kasiski_examination(ciphertext)
+            # Длинные ключи (больше предела Касиски) находит метод Фридмана
+            for k_len, _ in cryptoanalysis.friedman_examination(ciphertext):
+                if k_len not in key_length_candidates:
+                    key_length_candidates.append(k_len)
+            if monoalphabetic and 1 not in key_length_candidates:
+                key_length_candidates.append(1)
+    best_accuracy = 0
+    best_found_key = ""
+    best_key_length = 0
+    best_decrypted = ""
+
+    # Полное дешифрование и оценка только для лучших по chi2 кандидатов
+    with profiling.stage("main.attack", len(ciphertext)):
+        ranked_candidates = cryptoanalysis.rank_key_lengths(
+            ciphertext, key_length_candidates
+        )
+
+    for k_len, found_key, _ in ranked_candidates:
+        with profiling.stage("main.attack", len(ciphertext)):
+            decrypted = vigenere.vigenere_decrypt(ciphertext, found_key)
+
+        # Проверка точности
+        with profiling.stage("main.accuracy", len(ciphertext)):
+            accuracy = metrics.text_accuracy(encoded_plaintext, decrypted)
+
+        if accuracy > best_accuracy:
+            best_accuracy = accuracy
+            best_found_key = found_key
+            best_key_length = k_len
+            best_decrypted = decrypted
+
+    decrypt_time = time.time() - start_time
+
+    with profiling.stage("main.scoring", len(ciphertext)):
+        # Сравнение ключей
+        key_accuracy = compare_keys(key, best_found_key)
+        # С учётом периодичности: найденный ключ кратной или делящей длины
+        periodic_key_accuracy = metrics.key_accuracy(key, best_found_key, periodic=True)
+
+        # Декрипт с оригинальным ключом для проверки
+        correct_decrypted = vigenere.vigenere_decrypt(ciphertext, key)
+        correct_accuracy = metrics.text_accuracy(encoded_plaintext, correct_decrypted)
+
+    return {
+        "original_key": key,
+        "found_key": best_found_key,
+        "key_accuracy": key_accuracy,
+        "periodic_key_accuracy": periodic_key_accuracy,
+        "key_length": key_info["length"],
+        "key_period": len(primitive_key),
+        "monoalphabetic": monoalphabetic,
+        "key_entropy": key_info["entropy"],
+        "key_distribution": key_info["distribution"],
+        "encrypt_time": encrypt_time,
+        "decrypt_time": decrypt_time,
+        "text_accuracy": best_accuracy,
+        "correct_decrypt_accuracy": correct_accuracy,
+        "ciphertext": (
+            str(ciphertext[:100]) + "..." if len(ciphertext) > 100 else str(ciphertext)
+        ),
+        "decrypted_with_found": (
+            str(best_decrypted[:100]) + "..." if best_decrypted else ""
+        ),
+        "decrypted_with_original": (
+            str(correct_decrypted[:100]) + "..." if correct_decrypted else ""
+        ),
+    }
+
+
+def process_key(encoded_plaintext, key_info):
+    """Анализ одного ключа с перехватом ошибок (None при ошибке)"""
+    try:
+        if not profiling.is_enabled():
+            return analyze_key(encoded_plaintext, key_info)
+        # Поэтапная статистика собирается отдельно для каждого ключа
+        profiling.reset()
+        result = analyze_key(encoded_plaintext, key_info)
+        result["profile"] = profiling.snapshot()
+        return result
+    except Exception as e:
+        print(f"Ошибка при обработке ключа '{key_info['key'][:10]}...': {str(e)}")
+        return None
+
+
+# Открытый текст в процессе-обработчике (разделяемая память, а не копия в каждой задаче)
+_worker_plaintext = None
+_worker_memory = None
+
+
+def _init_worker(memory_name, size, profile, profile_memory):
+    """Подключение процесса пула к разделяемой памяти с открытым текстом"""
+    from multiprocessing import shared_memory
+
+    global _worker_plaintext, _worker_memory
+    if profile:
+        profiling.enable(track_memory=profile_memory)
+    _worker_memory = shared_memory.SharedMemory(name=memory_name)
+    indices = np.ndarray((size,), dtype=np.uint8, buffer=_worker_memory.buf)
+    _worker_plaintext = vigenere.EncodedText(indices)
+
+
+def _process_key_in_worker(key_info):
+    return process_key(_worker_plaintext, key_info)
+
+
+def run_parallel(encoded_plaintext, key_characteristics, workers):
+    """Анализ ключей в пуле процессов; результаты выдаются по мере готовности
+
+    Порядок результатов совпадает с порядком ключей.
+    """
+    # Пул процессов нужен только при workers > 1 и загружается по требованию
+    from concurrent.futures import ProcessPoolExecutor
+    from multiprocessing import shared_memory
+
+    size = len(encoded_plaintext)
+    memory = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    shared = np.ndarray((size,), dtype=np.uint8, buffer=memory.buf)
+    shared[:] = encoded_plaintext.indices
+    del shared  # Представление буфера не должно мешать закрытию памяти
+    try:
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(
+                memory.name,
+                size,
+                profiling.is_enabled(),
+                tracemalloc.is_tracing(),
+            ),
+        ) as executor:
+            chunksize = max(1, len(key_characteristics) // (workers * 4))
+            yield from executor.map(
+                _process_key_in_worker, key_characteristics, chunksize=chunksize
+            )
+    finally:
+        memory.close()
+        memory.unlink()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Анализ криптостойкости шифра Виженера"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="число процессов для анализа ключей (по умолчанию 1)",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="поэтапная статистика по каждому ключу в results_profile.json",
+    )
+    parser.add_argument(
+        "--profile-memory",
+        action="store_true",
+        help="учитывать пик памяти этапов (tracemalloc, заметно замедляет)",
+    )
+    parser.add_argument(
+        "--cprofile",
+        metavar="FILE",
+        help="сохранить статистику cProfile основного процесса в FILE",
+    )
+    parser.add_argument(
+        "--tracemalloc-snapshot",
+        metavar="FILE",
+        help="сохранить снимок tracemalloc основного процесса в FILE",
+    )
+    parser.add_argument(
+        "--cache",
+        metavar="FILE",
+        default=result_cache.DEFAULT_CACHE_FILE,
+        help="файл кэша результатов (по умолчанию results_cache.sqlite)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="анализировать все ключи заново, не используя кэш",
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=result_cache.DEFAULT_MAX_ENTRIES,
+        help="наибольшее число записей в кэше (вытесняются давно не использованные)",
+    )
+    parser.add_argument(
+        "--results",
+        metavar="FILE",
+        default=results_io.DEFAULT_RESULTS_FILE,
+        help="файл результатов в формате JSON Lines (по умолчанию results.jsonl)",
+    )
+    parser.add_argument(
+        "--no-plot",
+        action="store_true",
+        help="не строить графики (matplotlib не загружается)",
+    )
+    parser.add_argument(
+        "--no-text-report",
+        action="store_true",
+        help="не формировать текстовый отчёт results.txt",
+    )
+    return parser.parse_args()
 
 
 def main():
+    args = parse_args()
+    if args.profile or args.profile_memory:
+        profiling.enable(track_memory=args.profile_memory)
+    if args.tracemalloc_snapshot and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    profiler = cProfile.Profile() if args.cprofile else None
+    if profiler:
+        profiler.enable()
+    try:
+        run(args)
+    finally:
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(args.cprofile)
+            print(f"Статистика cProfile сохранена в {args.cprofile}")
+        if args.tracemalloc_snapshot:
+            tracemalloc.take_snapshot().dump(args.tracemalloc_snapshot)
+            print(f"Снимок tracemalloc сохранён в {args.tracemalloc_snapshot}")
+
+
+def run(args):
+    """Полный цикл анализа: ключи, шифрование, атаки, отчёт и графики"""
+    workers = max(1, args.workers)
     INPUT_FILE = "input.txt"
     OUTPUT_FILE = "results.txt"
+    PROFILE_FILE = "results_profile.json"  # Поэтапная статистика по ключам
     KEYS_FILE = "keys.txt"  # Файл с сгенерированными ключами
     DEFAULT_KEYS = [
         "АААААААААААААААААААААААААААААААААААААААААААААААААААААААААААААААААААААААААААААААААААААААААААААААААААА",
@@ -104,141 +373,114 @@ def main():
     with open(INPUT_FILE, "r", encoding="utf-8") as f:
         plaintext = f.read()
 
-    results = []
+    # Очистка и кодирование корпуса выполняются один раз за запуск
+    encoded_plaintext = vigenere.EncodedText.from_text(plaintext)
 
     # Сбор характеристик ключей
-    key_characteristics = []
-    for key in unique_keys:
-        key_characteristics.append(
-            {
-                "key": key,
-                "length": len(key),
-                "entropy": calculate_entropy(key),
-                "distribution": detect_key_distribution(key),
-            }
-        )
-
-    for key_info in key_characteristics:
-        key = key_info["key"]
-        try:
-            # Шифрование
-            start_time = time.time()
-            ciphertext = vigenere.vigenere_encrypt(plaintext, key)
-            encrypt_time = time.time() - start_time
+    key_characteristics = [describe_key(key) for key in unique_keys]
 
-            # Атака
-            start_time = time.time()
-            key_length_candidates = cryptoanalysis.kasiski_examination(ciphertext)
-            best_accuracy = 0
-            best_found_key = ""
-            best_key_length = 0
-            best_decrypted = ""
-
-            for k_len in key_length_candidates:
-                found_key = cryptoanalysis.frequency_attack(ciphertext, k_len)
-                decrypted = vigenere.vigenere_decrypt(ciphertext, found_key)
-
-                # Проверка точности
-                clean_plain = vigenere.clean_text(plaintext)
-                clean_decrypted = vigenere.clean_text(decrypted)
-                min_len = min(len(clean_plain), len(clean_decrypted))
-                accuracy = (
-                    sum(
-                        1
-                        for i in range(min_len)
-                        if clean_plain[i] == clean_decrypted[i]
-                    )
-                    / len(clean_plain)
-                    * 100
-                )
+    # Профилирование измеряет реальную работу, поэтому кэш при нём не используется
+    if args.no_cache or profiling.is_enabled():
+        results = analyze_keys(encoded_plaintext, key_characteristics, workers)
+    else:
+        results = analyze_keys_cached(
+            encoded_plaintext, key_characteristics, workers, args
+        )
 
-                if accuracy > best_accuracy:
-                    best_accuracy = accuracy
-                    best_found_key = found_key
-                    best_key_length = k_len
-                    best_decrypted = decrypted
-
-            decrypt_time = time.time() - start_time
-
-            # Сравнение ключей
-            key_accuracy = compare_keys(key, best_found_key)
-
-            # Декрипт с оригинальным ключом для проверки
-            correct_decrypted = vigenere.vigenere_decrypt(ciphertext, key)
-            clean_correct = vigenere.clean_text(correct_decrypted)
-            clean_original = vigenere.clean_text(plaintext)
-            correct_accuracy = (
-                sum(
-                    1
-                    for i in range(min(len(clean_original), len(clean_correct)))
-                    if clean_original[i] == clean_correct[i]
+    # Результаты записываются по мере готовности, а не копятся в памяти
+    profile_records = []
+    with results_io.ResultWriter(args.results) as writer:
+        for res in results:
+            if res is None:
+                continue
+            if "profile" in res:
+                profile_records.append(
+                    {"key": res["original_key"], "stages": res.pop("profile")}
                 )
-                / len(clean_original)
-                * 100
-            )
-
-            results.append(
-                {
-                    "original_key": key,
-                    "found_key": best_found_key,
-                    "key_accuracy": key_accuracy,
-                    "key_length": key_info["length"],
-                    "key_entropy": key_info["entropy"],
-                    "key_distribution": key_info["distribution"],
-                    "encrypt_time": encrypt_time,
-                    "decrypt_time": decrypt_time,
-                    "text_accuracy": best_accuracy,
-                    "correct_decrypt_accuracy": correct_accuracy,
-                    "ciphertext": (
-                        ciphertext[:100] + "..."
-                        if len(ciphertext) > 100
-                        else ciphertext
-                    ),
-                    "decrypted_with_found": (
-                        best_decrypted[:100] + "..." if best_decrypted else ""
-                    ),
-                    "decrypted_with_original": (
-                        correct_decrypted[:100] + "..." if correct_decrypted else ""
-                    ),
-                }
-            )
-        except Exception as e:
-            print(f"Ошибка при обработке ключа '{key[:10]}...': {str(e)}")
-
-    # Сохранение результатов в файл
-    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-        for i, res in enumerate(results):
-            f.write(f"Тест #{i+1}\n")
-            f.write(f"Исходный ключ: {res['original_key']}\n")
-            f.write(f"Найденный ключ: {res['found_key']}\n")
-            f.write(f"Точность ключа: {res['key_accuracy']:.2f}%\n")
-            f.write(f"Длина ключа: {res['key_length']}\n")
-            f.write(f"Энтропия ключа: {res['key_entropy']:.4f}\n")
-            f.write(f"Тип распределения: {res['key_distribution']}\n")
-            f.write(f"Время шифрования: {res['encrypt_time']:.6f} сек\n")
-            f.write(f"Время атаки: {res['decrypt_time']:.6f} сек\n")
-            f.write(f"Точность текста: {res['text_accuracy']:.2f}%\n")
-            f.write(
-                f"Точность правильного декрипта: {res['correct_decrypt_accuracy']:.2f}%\n"
-            )
-            f.write(f"Шифртекст (начало): {res['ciphertext']}\n")
-            f.write(
-                f"Расшифровано найденным ключом (начало): {res['decrypted_with_found']}\n"
-            )
-            f.write(
-                f"Расшифровано исходным ключом (начало): {res['decrypted_with_original']}\n"
-            )
-            f.write("-" * 80 + "\n")
+            writer.write(res)
+    print(f"Результаты сохранены в {args.results}")
 
-    print(f"Результаты сохранены в {OUTPUT_FILE}")
+    if not args.no_text_report:
+        save_results(results_io.iter_results(args.results), OUTPUT_FILE)
+    if profiling.is_enabled():
+        profiling.save_report(profile_records, PROFILE_FILE)
+        print(f"Поэтапная статистика сохранена в {PROFILE_FILE}")
 
     # ================================================
     # ПОСТРОЕНИЕ ГРАФИКОВ ЗАВИСИМОСТИ ТОЧНОСТИ КЛЮЧА
     # ================================================
-    if not results:
+    if args.no_plot:
+        return
+    if writer.count == 0:
         print("Нет данных для построения графиков")
         return
 
+    plot_results(results_io.load_results(args.results, PLOT_FIELDS))
+
+
+def analyze_keys(encoded_plaintext, key_characteristics, workers):
+    """Анализ ключей последовательно или в пуле процессов (по мере готовности)"""
+    if workers > 1:
+        return run_parallel(encoded_plaintext, key_characteristics, workers)
+    return (
+        process_key(encoded_plaintext, key_info) for key_info in key_characteristics
+    )
+
+
+def analyze_keys_cached(encoded_plaintext, key_characteristics, workers, args):
+    """Анализ только новых ключей; остальные результаты берутся из кэша
+
+    Результаты выдаются в порядке ключей по мере готовности.
+    """
+    fingerprint = result_cache.algorithm_fingerprint(
+        [
+            __file__,
+            vigenere.__file__,
+            cryptoanalysis.__file__,
+            metrics.__file__,
+            language.__file__,
+            text_cleaning.__file__,
+        ],
+        language.CURRENT.digest(),
+    )
+    corpus = result_cache.corpus_digest(encoded_plaintext)
+    with result_cache.ResultCache(args.cache, fingerprint, args.cache_size) as cache:
+        cached = cache.get_many(corpus, [info["key"] for info in key_characteristics])
+        missing = [info for info in key_characteristics if info["key"] not in cached]
+        print(f"Из кэша: {len(cached)}, к анализу: {len(missing)}")
+
+        computed = analyze_keys(encoded_plaintext, missing, workers)
+        new_results = {}
+        try:
+            for info in key_characteristics:
+                if info["key"] in cached:
+                    yield cached[info["key"]]
+                    continue
+                res = next(computed)
+                if res is not None:
+                    new_results[info["key"]] = res
+                yield res
+        finally:
+            computed.close()
+            # Сохраняются и результаты прерванного запуска
+            cache.put_many(corpus, new_results)
+
+
+def save_results(results, output_file):
+    """Сохранение результатов в текстовый отчёт"""
+    results_io.render_text_report(results, output_file)
+    print(f"Текстовый отчёт сохранён в {output_file}")
+
+
+# Поля результатов, нужные для графиков
+PLOT_FIELDS = ["key_length", "key_accuracy", "key_entropy", "key_distribution"]
+
+
+def plot_results(results):
+    """Построение графиков зависимости точности ключа от характеристик"""
+    # matplotlib загружается только здесь: без графиков запуск заметно быстрее
+    import matplotlib.pyplot as plt
+
     plt.figure(figsize=(15, 12))
     plt.suptitle("Анализ криптостойкости шифра Виженера", fontsize=16)
 
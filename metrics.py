@@ -0,0 +1,72 @@
+import math
+
+import numpy as np
+
+from vigenere import EncodedText, as_encoded
+
+# Наибольшее число позиций при сравнении ключей как периодических последовательностей
+MAX_PERIODIC_POSITIONS = 1 << 16
+
+
+def text_accuracy(reference, candidate):
+    """Доля совпавших букв (в процентах от длины эталона) на общей длине текстов"""
+    reference = as_encoded(reference).indices
+    candidate = as_encoded(candidate).indices
+    if len(reference) == 0:
+        return 0.0
+    common = min(len(reference), len(candidate))
+    matches = np.count_nonzero(reference[:common] == candidate[:common])
+    return matches / len(reference) * 100
+
+
+def error_map(reference, candidate):
+    """Маска ошибок по позициям на общей длине текстов (True - буква не совпала)"""
+    reference = as_encoded(reference).indices
+    candidate = as_encoded(candidate).indices
+    common = min(len(reference), len(candidate))
+    return reference[:common] != candidate[:common]
+
+
+def column_error_rates(reference, candidate, period):
+    """Доля ошибок в каждом столбце (позиции ключа) при заданном периоде"""
+    errors = error_map(reference, candidate)
+    columns = np.arange(len(errors)) % period
+    totals = np.bincount(columns, minlength=period)
+    wrong = np.bincount(columns, weights=errors, minlength=period)
+    return wrong / np.maximum(totals, 1)
+
+
+def _key_array(key):
+    """Ключ как массив: EncodedText - индексы букв, строка - коды символов как есть"""
+    if isinstance(key, EncodedText):
+        return key.indices
+    return np.frombuffer(key.encode("utf-32-le"), dtype="<u4")
+
+
+def key_accuracy(original, found, periodic=False):
+    """Точность восстановления ключа в процентах
+
+    По умолчанию ключи сравниваются посимвольно на общей длине. С
+    periodic=True ключи, повторённые до длины НОК их длин, сравниваются
+    позиция в позицию: это доля позиций текста, где оба ключа дают один и
+    тот же сдвиг, поэтому ключ, найденный с кратным или делящим истинную
+    длину периодом, оценивается по тому, как он на самом деле шифрует.
+    Строки сравниваются без очистки (как в main.compare_keys).
+    """
+    if isinstance(original, EncodedText) or isinstance(found, EncodedText):
+        original, found = as_encoded(original).indices, as_encoded(found).indices
+    else:
+        original, found = _key_array(original), _key_array(found)
+    if len(original) == 0 or len(found) == 0:
+        return 0.0
+
+    if not periodic:
+        common = min(len(original), len(found))
+        matches = np.count_nonzero(original[:common] == found[:common])
+        return matches / common * 100
+
+    size = min(math.lcm(len(original), len(found)), MAX_PERIODIC_POSITIONS)
+    positions = np.arange(size)
+    original_tiled = original[positions % len(original)]
+    found_tiled = found[positions % len(found)]
+    return np.count_nonzero(original_tiled == found_tiled) / size * 100
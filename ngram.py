@@ -0,0 +1,283 @@
+import os
+
+import numpy as np
+
+import vigenere
+from language import CURRENT, DIGEST_SIZE
+from profiling import instrumented
+from vigenere import N_LETTERS
+
+# Формат файла таблиц: заголовок MAGIC, отпечаток языка (DIGEST_SIZE байт),
+# затем таблицы float32 порядков ORDERS подряд
+MAGIC = b"VGNNGR02"
+HEADER_SIZE = len(MAGIC) + DIGEST_SIZE
+# Общее начало MAGIC всех версий формата (без номера версии)
+_MAGIC_PREFIX = b"VGNNGR"
+ORDERS = (2, 4)
+
+DEFAULT_CORPUS = "input.txt"
+DEFAULT_TABLES_FILE = f"ngrams-{CURRENT.name}.bin"
+
+
+def ngram_codes(indices, order):
+    """Коды всех n-грамм текста (скользящее окно), упакованные по основанию n"""
+    count = len(indices) - order + 1
+    if count <= 0:
+        return np.zeros(0, dtype=np.int64)
+    codes = indices[:count].astype(np.int64)
+    for offset in range(1, order):
+        codes *= N_LETTERS
+        codes += indices[offset : offset + count]
+    return codes
+
+
+def build_table(indices, order):
+    """Плотная таблица log10-вероятностей n-грамм (n ** order значений)
+
+    Не встретившиеся в корпусе n-граммы получают вероятность 0.01 / total.
+    """
+    counts = np.bincount(ngram_codes(indices, order), minlength=N_LETTERS**order)
+    total = max(int(counts.sum()), 1)
+    floor = np.log10(0.01 / total)
+    with np.errstate(divide="ignore"):
+        table = np.log10(counts / total)
+    table[counts == 0] = floor
+    return table.astype(np.float32)
+
+
+class NgramModel:
+    """Таблицы log-вероятностей биграмм и квадграмм с векторной оценкой текста"""
+
+    def __init__(self, tables):
+        self.tables = tables  # порядок -> массив n ** порядок
+
+    @classmethod
+    def from_corpus(cls, corpus):
+        indices = vigenere.as_encoded(corpus).indices
+        return cls({order: build_table(indices, order) for order in ORDERS})
+
+    def save(self, path):
+        """Сохранение таблиц в компактный двоичный файл"""
+        with open(path, "wb") as f:
+            f.write(MAGIC)
+            f.write(CURRENT.binary_digest())
+            for order in ORDERS:
+                f.write(self.tables[order].astype("<f4").tobytes())
+
+    @classmethod
+    def load(cls, path):
+        """Загрузка таблиц через memmap (без чтения файла целиком)
+
+        Таблицы другого языка или другого размера не загружаются.
+        """
+        with open(path, "rb") as f:
+            header = f.read(HEADER_SIZE)
+        if header[: len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} не является файлом таблиц n-грамм")
+        if header[len(MAGIC) :] != CURRENT.binary_digest():
+            raise ValueError(
+                f"{path} построен для другого языка (текущий: {CURRENT.name})"
+            )
+        expected_size = HEADER_SIZE + sum(N_LETTERS**order for order in ORDERS) * 4
+        if os.path.getsize(path) != expected_size:
+            raise ValueError(f"Файл таблиц n-грамм {path} повреждён")
+        tables = {}
+        offset = HEADER_SIZE
+        for order in ORDERS:
+            size = N_LETTERS**order
+            tables[order] = np.memmap(
+                path, dtype="<f4", mode="r", offset=offset, shape=(size,)
+            )
+            offset += size * 4
+        return cls(tables)
+
+    def window_scores(self, indices, order=4):
+        """Log-вероятность каждого окна из order букв"""
+        return self.tables[order][ngram_codes(indices, order)]
+
+    def score(self, text, order=4):
+        """Суммарная log-вероятность текста (больше - ближе к языку)"""
+        indices = vigenere.as_encoded(text).indices
+        return float(self.window_scores(indices, order).sum(dtype=np.float64))
+
+
+def _is_current_tables(path):
+    """Файл таблиц n-грамм текущей версии и текущего языка"""
+    with open(path, "rb") as f:
+        return f.read(HEADER_SIZE) == MAGIC + CURRENT.binary_digest()
+
+
+def _is_tables_file(path):
+    """Файл таблиц n-грамм любой версии и любого языка"""
+    with open(path, "rb") as f:
+        return f.read(len(_MAGIC_PREFIX)) == _MAGIC_PREFIX
+
+
+def load_model(path=DEFAULT_TABLES_FILE, corpus_path=DEFAULT_CORPUS):
+    """Модель n-грамм из файла таблиц
+
+    Таблицы строятся по корпусу, если файла нет или в нём таблицы другой
+    версии или другого языка; чужие файлы не перезаписываются.
+    """
+    if not os.path.exists(path) or (
+        _is_tables_file(path) and not _is_current_tables(path)
+    ):
+        with open(corpus_path, "r", encoding="utf-8") as f:
+            NgramModel.from_corpus(f.read()).save(path)
+    return NgramModel.load(path)
+
+
+# Таблица дешифрования одной буквы: _DECRYPTION_TABLE[s, c] = (c - s) mod n
+_DECRYPTION_TABLE = (np.arange(N_LETTERS) - np.arange(N_LETTERS)[:, None]) % N_LETTERS
+
+
+def _affected_windows(positions, size, order):
+    """Начала окон, содержащих хотя бы одну из позиций"""
+    starts = (positions[:, None] - np.arange(order)).ravel()
+    starts = starts[(starts >= 0) & (starts <= size - order)]
+    return np.unique(starts)
+
+
+class IncrementalEvaluator:
+    """Оценка ключа с пересчётом только изменённого столбца
+
+    Хранит расшифрованный текст (столбец i - срез plain[i::period]),
+    оценку каждого окна из order букв и их сумму. Смена буквы ключа в
+    позиции i пересчитывает лишь окна, пересекающие столбец i, т.е.
+    шаг поиска стоит O(n / period), а не O(n).
+    """
+
+    def __init__(self, ciphertext, key, model, order=4):
+        self.cipher = vigenere.as_encoded(ciphertext).indices.astype(np.int64)
+        self.shifts = vigenere.as_encoded(key).indices.astype(np.int64)
+        self.period = len(self.shifts)
+        if self.period == 0:
+            raise ValueError("Пустой ключ")
+        self.order = order
+        self.table = np.asarray(model.tables[order])
+        self.powers = N_LETTERS ** np.arange(order - 1, -1, -1)
+        positions = np.arange(len(self.cipher))
+        self.plain = (self.cipher - self.shifts[positions % self.period]) % N_LETTERS
+        self.window_scores = self.table[ngram_codes(self.plain, order)].astype(
+            np.float64
+        )
+        self.fitness = float(self.window_scores.sum())
+        self._columns = {}
+
+    @property
+    def key(self):
+        return str(vigenere.EncodedText(self.shifts))
+
+    def _column(self, position):
+        """Окна, пересекающие столбец, и веса его букв в кодах окон (кэшируются)"""
+        column = self._columns.get(position)
+        if column is None:
+            size = len(self.cipher)
+            positions = np.arange(position, size, self.period)
+            starts = _affected_windows(positions, size, self.order)
+            window_positions = starts[:, None] + np.arange(self.order)
+            column_weights = np.where(
+                window_positions % self.period == position, self.powers, 0
+            )
+            column = (starts, window_positions, column_weights)
+            self._columns[position] = column
+        return column
+
+    def _fixed_codes(self, window_positions, column_weights):
+        """Вклад букв других столбцов в коды окон"""
+        return (self.plain[window_positions] * (self.powers - column_weights)).sum(1)
+
+    def deltas(self, position):
+        """Изменение оценки для каждого из n сдвигов в позиции ключа"""
+        starts, window_positions, column_weights = self._column(position)
+        codes = np.einsum(
+            "swk,wk->sw",
+            _DECRYPTION_TABLE[:, self.cipher[window_positions]],
+            column_weights,
+        )
+        codes += self._fixed_codes(window_positions, column_weights)
+        scores = self.table[codes].sum(axis=1, dtype=np.float64)
+        return scores - self.window_scores[starts].sum()
+
+    def propose(self, position, shift):
+        """Изменение оценки при замене сдвига в позиции ключа (без применения)"""
+        starts, scores = self._new_scores(position, shift)
+        return scores.sum() - self.window_scores[starts].sum()
+
+    def _new_scores(self, position, shift):
+        starts, window_positions, column_weights = self._column(position)
+        letters = _DECRYPTION_TABLE[shift, self.cipher[window_positions]]
+        codes = (letters * column_weights).sum(1)
+        codes += self._fixed_codes(window_positions, column_weights)
+        return starts, self.table[codes].astype(np.float64)
+
+    def apply(self, position, shift):
+        """Замена сдвига в позиции ключа с обновлением текста и оценок"""
+        starts, scores = self._new_scores(position, shift)
+        self.fitness += scores.sum() - self.window_scores[starts].sum()
+        self.window_scores[starts] = scores
+        self.shifts[position] = shift
+        column = slice(position, None, self.period)
+        self.plain[column] = _DECRYPTION_TABLE[shift, self.cipher[column]]
+
+
+@instrumented("ngram.refine_key")
+def refine_key(ciphertext, key, model, order=4, max_rounds=10):
+    """Уточнение ключа восхождением к вершине по n-граммной оценке
+
+    Начинает с ключа частотного анализа. Для каждой позиции ключа все
+    буквы оцениваются сразу через IncrementalEvaluator. Позиция меняется,
+    если оценка растёт; проходы повторяются, пока ключ меняется (не более
+    max_rounds).
+    """
+    if len(vigenere.as_encoded(key)) == 0 or len(ciphertext) < order:
+        return str(vigenere.as_encoded(key))
+    evaluator = IncrementalEvaluator(ciphertext, key, model, order)
+    for _ in range(max_rounds):
+        changed = False
+        for position in range(evaluator.period):
+            deltas = evaluator.deltas(position)
+            best = int(np.argmax(deltas))
+            if deltas[best] > 0 and best != evaluator.shifts[position]:
+                evaluator.apply(position, best)
+                changed = True
+        if not changed:
+            break
+    return evaluator.key
+
+
+@instrumented("ngram.anneal_key")
+def anneal_key(
+    ciphertext,
+    key,
+    model,
+    order=4,
+    steps=20000,
+    temperature=10.0,
+    cooling=0.9995,
+    seed=None,
+):
+    """Уточнение ключа имитацией отжига по n-граммной оценке
+
+    На каждом шаге случайная позиция ключа получает случайный сдвиг;
+    ухудшение на delta принимается с вероятностью 10 ** (delta / T).
+    Возвращает лучший встреченный ключ.
+    """
+    if len(vigenere.as_encoded(key)) == 0 or len(ciphertext) < order:
+        return str(vigenere.as_encoded(key))
+    evaluator = IncrementalEvaluator(ciphertext, key, model, order)
+    rng = np.random.default_rng(seed)
+    positions = rng.integers(evaluator.period, size=steps)
+    shifts = rng.integers(N_LETTERS, size=steps)
+    thresholds = np.log10(rng.random(steps))
+    best_fitness, best_key = evaluator.fitness, evaluator.key
+    for position, shift, threshold in zip(positions, shifts, thresholds):
+        if shift == evaluator.shifts[position]:
+            continue
+        delta = evaluator.propose(position, shift)
+        if delta > 0 or delta / temperature > threshold:
+            evaluator.apply(position, shift)
+            if evaluator.fitness > best_fitness:
+                best_fitness, best_key = evaluator.fitness, evaluator.key
+        temperature *= cooling
+    return best_key
@@ -0,0 +1,201 @@
+import math
+import os
+
+import numpy as np
+
+import cryptoanalysis
+import vigenere
+from ciphertext_store import DEFAULT_MAX_PERIOD, ColumnHistograms, compute_histograms
+from language import CURRENT
+from vigenere import ALPHABET, N_LETTERS
+
+# Суффикс файла индекса рядом с файлом корпуса (свой для языка)
+INDEX_SUFFIX = f".{CURRENT.name}.index.npz"
+# Версия формата индекса: индексы других версий перестраиваются
+INDEX_VERSION = 2
+
+# Число столбцов, оцениваемых за один вызов chi2 (промежуточные массивы в кэше)
+_SCORING_BLOCK_COLUMNS = 1 << 11
+
+
+def _repeats(indices, order):
+    """Позиции повторяющихся n-грамм, сгруппированные по n-грамме
+
+    Группы строятся теми же функциями и с теми же границами, что в
+    cryptoanalysis.kasiski_examination. Возвращает позиции (внутри группы -
+    по возрастанию) и номер группы для каждой позиции.
+    """
+    count = len(indices) - order
+    all_positions, all_group_ids = [], []
+    n_groups = 0
+    if count > 0:
+        for positions in cryptoanalysis._position_buckets(indices, count):
+            if len(positions) < 2:
+                continue
+            positions, group_ids, first_positions = cryptoanalysis._repeated_groups(
+                indices, positions, order
+            )
+            all_positions.append(positions)
+            all_group_ids.append(group_ids + n_groups)
+            n_groups += len(first_positions)
+    if not all_positions:
+        return np.zeros(0, np.int64), np.zeros(0, np.int64)
+    return np.concatenate(all_positions), np.concatenate(all_group_ids)
+
+
+def _pairs_with_equal_residues(positions, group_ids, modulus):
+    """Число пар позиций одной группы с одинаковым остатком по модулю"""
+    if len(positions) == 0:
+        return 0
+    n_groups = int(group_ids[-1]) + 1
+    return int(
+        cryptoanalysis._pairs_per_group(positions, group_ids, n_groups, modulus).sum()
+    )
+
+
+class PlaintextIndex:
+    """Статистика открытого текста, общая для всех ключей
+
+    Шифр Виженера лишь поворачивает гистограмму каждого столбца на сдвиг
+    ключа, поэтому гистограммы столбцов шифртекста для любого ключа длины
+    не больше max_period получаются из гистограмм открытого текста без
+    шифрования. Повтор n-граммы открытого текста остаётся повтором в
+    шифртексте, если расстояние кратно длине ключа.
+    """
+
+    def __init__(self, histograms, repeats):
+        self.histograms = histograms  # ciphertext_store.ColumnHistograms
+        self.repeats = repeats  # длина n-граммы -> (позиции, номера групп)
+
+    @classmethod
+    def build(cls, encoded, max_period=DEFAULT_MAX_PERIOD):
+        indices = vigenere.as_encoded(encoded).indices
+        repeats = {
+            order: _repeats(indices, order)
+            for order in cryptoanalysis.KASISKI_NGRAM_LENGTHS
+        }
+        return cls(compute_histograms(encoded, max_period), repeats)
+
+    @property
+    def max_period(self):
+        return self.histograms.max_period
+
+    def save(self, path, **metadata):
+        arrays = {}
+        for order, (positions, group_ids) in self.repeats.items():
+            arrays[f"positions_{order}"] = positions
+            arrays[f"group_ids_{order}"] = group_ids
+        np.savez(
+            path,
+            histograms=self.histograms.table,
+            length=self.histograms.length,
+            orders=np.array(list(self.repeats)),
+            language=CURRENT.digest(),
+            **arrays,
+            **metadata,
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            if "language" not in data or str(data["language"]) != CURRENT.digest():
+                raise ValueError(
+                    f"{path} построен для другого языка (текущий: {CURRENT.name})"
+                )
+            histograms = ColumnHistograms(data["histograms"], int(data["length"]))
+            repeats = {
+                int(order): (data[f"positions_{order}"], data[f"group_ids_{order}"])
+                for order in data["orders"]
+            }
+        return cls(histograms, repeats)
+
+    def _key_shifts(self, keys):
+        shifts = np.array([vigenere.as_encoded(key).indices for key in keys])
+        key_length = shifts.shape[1]
+        if not 1 <= key_length <= self.max_period:
+            raise ValueError(
+                f"Длина ключа {key_length} вне диапазона индекса 1..{self.max_period}"
+            )
+        return shifts
+
+    def cipher_histograms(self, keys):
+        """Гистограммы столбцов шифртекста для ключей одной длины: (ключи, длина, n)
+
+        Буква c столбца со сдвигом s встречается столько же раз, сколько
+        буква (c - s) mod n того же столбца открытого текста.
+        """
+        shifts = self._key_shifts(keys)
+        key_length = shifts.shape[1]
+        letters = (np.arange(N_LETTERS) - shifts[:, :, None]) % N_LETTERS
+        return self.histograms[key_length][np.arange(key_length)[:, None], letters]
+
+    def recover_keys(self, keys):
+        """Ключи, которые частотный анализ найдёт при известной длине ключа
+
+        Совпадает с cryptoanalysis.frequency_attack для зашифрованного
+        корпуса (кроме точно равных chi2 сдвигов, где выбирается первый
+        сдвиг), но стоит лишь гистограмм. Ключи - одной длины; возвращает
+        список найденных ключей и массив их chi2 (среднее по столбцам).
+        """
+        keys = list(keys)
+        key_length = len(vigenere.as_encoded(keys[0])) if keys else 1
+        block = max(1, _SCORING_BLOCK_COLUMNS // max(key_length, 1))
+        alphabet = np.array(list(ALPHABET))
+        found, fitness = [], []
+        for first in range(0, len(keys), block):
+            histograms = self.cipher_histograms(keys[first : first + block])
+            count = len(histograms)
+            scores = cryptoanalysis.chi_squared_scores(
+                histograms.reshape(-1, N_LETTERS)
+            ).reshape(count, key_length, N_LETTERS)
+            best_shifts = np.argmin(scores, axis=2)
+            best_scores = np.take_along_axis(scores, best_shifts[:, :, None], axis=2)
+            found.extend("".join(row) for row in alphabet[best_shifts])
+            fitness.append(best_scores[:, :, 0].mean(axis=1))
+        return found, np.concatenate([np.zeros(0), *fitness])
+
+    def kasiski_counts(self, key_length, max_key_length=20):
+        """Число пар повторов с расстоянием, кратным каждому делителю 2..max_key_length
+
+        Учитываются повторы открытого текста, сохраняющиеся в шифртексте
+        (расстояние кратно длине ключа): пара кратна делителю f, если
+        остатки позиций совпадают по модулю НОК(длина ключа, f).
+        """
+        counts = dict.fromkeys(range(2, max_key_length + 1), 0)
+        for positions, group_ids in self.repeats.values():
+            for factor in counts:
+                modulus = math.lcm(key_length, factor)
+                counts[factor] += _pairs_with_equal_residues(
+                    positions, group_ids, modulus
+                )
+        return counts
+
+
+def load_index(corpus_path, max_period=DEFAULT_MAX_PERIOD):
+    """Индекс корпуса с кэшированием рядом с файлом корпуса
+
+    Индекс перестраивается, если корпус изменился, индекс построен другой
+    версией или для другого языка или в нём меньше периодов, чем запрошено.
+    """
+    index_path = corpus_path + INDEX_SUFFIX
+    mtime_ns = os.stat(corpus_path).st_mtime_ns
+    if os.path.exists(index_path):
+        with np.load(index_path) as data:
+            cached_mtime = int(data["mtime_ns"])
+            version = int(data["version"]) if "version" in data else 1
+            language = str(data["language"]) if "language" in data else None
+        if (
+            cached_mtime == mtime_ns
+            and version == INDEX_VERSION
+            and language == CURRENT.digest()
+        ):
+            index = PlaintextIndex.load(index_path)
+            if index.max_period >= max_period:
+                return index
+
+    with open(corpus_path, "r", encoding="utf-8") as f:
+        chunks = [vigenere.encode_text(chunk) for chunk in vigenere.read_chunks(f)]
+    encoded = vigenere.EncodedText(np.concatenate([np.zeros(0, np.uint8), *chunks]))
+    index = PlaintextIndex.build(encoded, max_period)
+    index.save(index_path, mtime_ns=mtime_ns, version=INDEX_VERSION)
+    return index
@@ -0,0 +1,117 @@
+import contextlib
+import functools
+import json
+import time
+import tracemalloc
+
+# Инструментирование выключено по умолчанию: проверка одного флага на вызов
+_enabled = False
+_track_memory = False
+_stats = {}
+# Стек активных этапов: [имя, наибольший пик памяти внутри этапа]
+_active = []
+
+_DISABLED_STAGE = contextlib.nullcontext()
+
+
+def enable(track_memory=False):
+    """Включение сбора статистики; track_memory - пик памяти через tracemalloc"""
+    global _enabled, _track_memory
+    _enabled = True
+    _track_memory = track_memory
+    if track_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def disable():
+    """Выключение сбора статистики"""
+    global _enabled, _track_memory
+    _enabled = False
+    if _track_memory and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    _track_memory = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def reset():
+    """Очистка накопленной статистики (например, перед очередным ключом)"""
+    _stats.clear()
+
+
+def snapshot():
+    """Копия статистики по этапам: время, число вызовов, пик памяти, размер входа"""
+    return {name: dict(values) for name, values in _stats.items()}
+
+
+def _record(name, elapsed, peak, size):
+    values = _stats.setdefault(
+        name, {"calls": 0, "total_s": 0.0, "peak_bytes": 0, "input_size": 0}
+    )
+    values["calls"] += 1
+    values["total_s"] += elapsed
+    values["peak_bytes"] = max(values["peak_bytes"], peak)
+    values["input_size"] = max(values["input_size"], size)
+
+
+@contextlib.contextmanager
+def _measured_stage(name, size):
+    start_memory = 0
+    if _track_memory:
+        start_memory, peak = tracemalloc.get_traced_memory()
+        # Пик до начала вложенного этапа принадлежит внешнему этапу
+        if _active:
+            _active[-1][1] = max(_active[-1][1], peak)
+        tracemalloc.reset_peak()
+    entry = [name, 0]
+    _active.append(entry)
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start_time
+        _active.pop()
+        peak = 0
+        if _track_memory:
+            absolute_peak = max(entry[1], tracemalloc.get_traced_memory()[1])
+            if _active:
+                _active[-1][1] = max(_active[-1][1], absolute_peak)
+            peak = max(absolute_peak - start_memory, 0)
+        _record(name, elapsed, peak, size)
+
+
+def stage(name, size=0):
+    """Контекст этапа конвейера; при выключенном сборе - пустой контекст"""
+    if not _enabled:
+        return _DISABLED_STAGE
+    return _measured_stage(name, size)
+
+
+def _input_size(args):
+    if args and hasattr(args[0], "__len__"):
+        return len(args[0])
+    return 0
+
+
+def instrumented(name):
+    """Декоратор: учитывает каждый вызов функции как этап name"""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with _measured_stage(name, _input_size(args)):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def save_report(records, path):
+    """Сохранение поэтапной статистики по ключам в JSON"""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(records, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,115 @@
+import hashlib
+import json
+import sqlite3
+import time
+
+# Версия формата записей: меняется при изменении состава полей результата
+CACHE_VERSION = "1"
+DEFAULT_CACHE_FILE = "results_cache.sqlite"
+DEFAULT_MAX_ENTRIES = 10_000
+
+# Ограничение числа параметров в одном запросе SQLite
+_QUERY_BATCH = 500
+
+
+def corpus_digest(encoded):
+    """SHA-256 закодированного корпуса (индексы букв после очистки)"""
+    return hashlib.sha256(encoded.indices.tobytes()).hexdigest()
+
+
+def algorithm_fingerprint(paths, settings=""):
+    """Отпечаток версии алгоритмов: хэш исходников модулей конвейера
+
+    Любое изменение кода атаки делает старые записи недоступными.
+    settings - строка с настройками, не видными в исходниках (например,
+    хэш выбранного языка).
+    """
+    digest = hashlib.sha256(CACHE_VERSION.encode())
+    digest.update(settings.encode("utf-8"))
+    for path in sorted(paths):
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """Кэш результатов анализа ключей в SQLite с вытеснением LRU
+
+    Запись определяется тройкой (корпус, ключ, отпечаток алгоритмов);
+    при превышении max_entries удаляются давно не использованные записи.
+    """
+
+    def __init__(self, path, fingerprint, max_entries=DEFAULT_MAX_ENTRIES):
+        self.fingerprint = fingerprint
+        self.max_entries = max_entries
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " corpus TEXT NOT NULL,"
+            " key TEXT NOT NULL,"
+            " fingerprint TEXT NOT NULL,"
+            " result TEXT NOT NULL,"
+            " last_used INTEGER NOT NULL,"
+            " PRIMARY KEY (corpus, key, fingerprint))"
+        )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)"
+        )
+
+    def get_many(self, corpus, keys):
+        """Словарь ключ -> результат для найденных в кэше ключей"""
+        found = {}
+        keys = list(keys)
+        now = time.time_ns()
+        with self.connection:
+            for start in range(0, len(keys), _QUERY_BATCH):
+                batch = keys[start : start + _QUERY_BATCH]
+                marks = ",".join("?" * len(batch))
+                rows = self.connection.execute(
+                    f"SELECT key, result FROM results WHERE corpus = ?"
+                    f" AND fingerprint = ? AND key IN ({marks})",
+                    [corpus, self.fingerprint, *batch],
+                ).fetchall()
+                for key, result in rows:
+                    found[key] = json.loads(result)
+                self.connection.executemany(
+                    "UPDATE results SET last_used = ? WHERE corpus = ?"
+                    " AND fingerprint = ? AND key = ?",
+                    [(now, corpus, self.fingerprint, key) for key, _ in rows],
+                )
+        return found
+
+    def put_many(self, corpus, results):
+        """Сохранение результатов (ключ -> результат) и вытеснение лишних записей"""
+        now = time.time_ns()
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)",
+                [
+                    (corpus, key, self.fingerprint, json.dumps(result), now)
+                    for key, result in results.items()
+                ],
+            )
+            self._evict()
+
+    def _evict(self):
+        (count,) = self.connection.execute("SELECT COUNT(*) FROM results").fetchone()
+        excess = count - self.max_entries
+        if excess > 0:
+            self.connection.execute(
+                "DELETE FROM results WHERE rowid IN"
+                " (SELECT rowid FROM results ORDER BY last_used LIMIT ?)",
+                (excess,),
+            )
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,84 @@
+import json
+
+DEFAULT_RESULTS_FILE = "results.jsonl"
+
+# Поля текстового отчёта: (подпись, поле, формат значения)
+TEXT_REPORT_FIELDS = [
+    ("Исходный ключ", "original_key", "{}"),
+    ("Найденный ключ", "found_key", "{}"),
+    ("Точность ключа", "key_accuracy", "{:.2f}%"),
+    ("Длина ключа", "key_length", "{}"),
+    ("Минимальный период ключа", "key_period", "{}"),
+    ("Энтропия ключа", "key_entropy", "{:.4f}"),
+    ("Тип распределения", "key_distribution", "{}"),
+    ("Время шифрования", "encrypt_time", "{:.6f} сек"),
+    ("Время атаки", "decrypt_time", "{:.6f} сек"),
+    ("Точность текста", "text_accuracy", "{:.2f}%"),
+    ("Точность правильного декрипта", "correct_decrypt_accuracy", "{:.2f}%"),
+    ("Шифртекст (начало)", "ciphertext", "{}"),
+    ("Расшифровано найденным ключом (начало)", "decrypted_with_found", "{}"),
+    ("Расшифровано исходным ключом (начало)", "decrypted_with_original", "{}"),
+]
+
+
+class ResultWriter:
+    """Потоковая запись результатов в JSON Lines (одна запись на строку)
+
+    Каждая запись сбрасывается на диск сразу, поэтому результаты не
+    копятся в памяти и доступны даже при прерванном запуске.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self.file = open(path, "w", encoding="utf-8")
+
+    def write(self, result):
+        self.file.write(json.dumps(result, ensure_ascii=False) + "\n")
+        self.file.flush()
+        self.count += 1
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def iter_results(path, fields=None):
+    """Записи результатов по одной; fields - оставить только эти поля"""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            result = json.loads(line)
+            if fields is not None:
+                result = {field: result[field] for field in fields}
+            yield result
+
+
+def load_results(path, fields=None):
+    """Все записи результатов списком"""
+    return list(iter_results(path, fields))
+
+
+def load_columns(path, fields):
+    """Результаты по столбцам: поле -> список значений в порядке ключей"""
+    columns = {field: [] for field in fields}
+    for result in iter_results(path, fields):
+        for field in fields:
+            columns[field].append(result[field])
+    return columns
+
+
+def render_text_report(results, output_file):
+    """Текстовый отчёт (по 16 строк на ключ) из записей результатов"""
+    with open(output_file, "w", encoding="utf-8") as f:
+        for i, res in enumerate(results):
+            f.write(f"Тест #{i+1}\n")
+            for label, field, value_format in TEXT_REPORT_FIELDS:
+                f.write(f"{label}: {value_format.format(res[field])}\n")
+            f.write("-" * 80 + "\n")
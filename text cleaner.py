@@ -1,17 +1,4 @@
-import re
-
-
-def remove_punctuation(text):
-    """
-    Удаляет все знаки препинания из текста
-    Сохраняет: русские буквы, цифры, пробелы, символы новой строки
-    """
-    # Регулярное выражение для удаления знаков препинания
-    # Сохраняем:
-    #   \w - буквы и цифры (включая русские в юникоде)
-    #   \s - пробельные символы (пробелы, переносы строк и т.д.)
-    pattern = r"[^\w\s]"
-    return re.sub(pattern, "", text)
+import text_cleaning
 
 
 def main():
@@ -20,20 +7,14 @@ def main():
     output_file = "result_text.txt"
 
     try:
-        # Чтение текста из файла
-        with open(input_file, "r", encoding="utf-8") as f:
-            text = f.read()
-
-        # Удаление знаков препинания
-        cleaned_text = remove_punctuation(text)
-
-        # Запись результата в файл
-        with open(output_file, "w", encoding="utf-8") as f:
-            f.write(cleaned_text)
+        # Потоковое удаление знаков препинания (файл не читается целиком)
+        read, written = text_cleaning.clean_file(
+            input_file, output_file, cleaner=text_cleaning.remove_punctuation
+        )
 
         print(f"\nУспешно обработано!")
-        print(f"Символов до обработки: {len(text)}")
-        print(f"Символов после обработки: {len(cleaned_text)}")
+        print(f"Символов до обработки: {read}")
+        print(f"Символов после обработки: {written}")
         print(f"Результат сохранен в: {output_file}")
 
     except Exception as e:
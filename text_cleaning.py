@@ -0,0 +1,105 @@
+import numpy as np
+
+from language import CURRENT, NOT_A_LETTER
+
+# Алфавит языка анализа (по умолчанию русский, Ё заменяется на Е при очистке)
+ALPHABET = CURRENT.alphabet
+
+# Размер порции при потоковой обработке (символов)
+DEFAULT_CHUNK_SIZE = 1 << 20
+
+# Таблица знаков препинания строится для BMP, остальные символы проверяются отдельно
+_BMP_SIZE = 0x10000
+
+# Таблица перекодировки: код символа -> индекс буквы или NOT_A_LETTER
+_LOOKUP = CURRENT.tables.lookup
+# Коды символов выше таблицы отображаются на её последний элемент ("заглушку")
+_LOOKUP_RANGE = len(_LOOKUP) - 1
+# Обратная таблица: индекс буквы -> код символа UTF-32
+_LETTER_CODES = CURRENT.tables.letter_codes
+
+
+def _is_kept(char):
+    """Символ сохраняется при удалении пунктуации (как [\\w\\s] в re)"""
+    return char.isalnum() or char == "_" or char.isspace()
+
+
+# Маска сохраняемых символов BMP строится при первом удалении пунктуации
+_keep_mask = None
+
+
+def _code_points(text):
+    return np.frombuffer(text.encode("utf-32-le"), dtype="<u4")
+
+
+def encode_text(text):
+    """Перевод текста в массив индексов букв (uint8) с одновременной очисткой"""
+    indices = _LOOKUP[np.minimum(_code_points(text), _LOOKUP_RANGE)]
+    return indices[indices != NOT_A_LETTER]
+
+
+def decode_indices(indices):
+    """Обратный перевод массива индексов букв в строку"""
+    return _LETTER_CODES[indices].tobytes().decode("utf-32-le")
+
+
+def clean_text(text):
+    """Очистка текста: оставляет только буквы алфавита (с заменами языка, Ё -> Е)"""
+    return decode_indices(encode_text(text))
+
+
+def remove_punctuation(text):
+    """Удаление знаков препинания: остаются буквы, цифры, "_" и пробельные символы
+
+    Совпадает с re.sub(r"[^\\w\\s]", "", text), но выполняется одной
+    выборкой по таблице вместо регулярного выражения.
+    """
+    global _keep_mask
+    if _keep_mask is None:
+        _keep_mask = np.array([_is_kept(chr(code)) for code in range(_BMP_SIZE)])
+    codes = _code_points(text)
+    keep = _keep_mask[np.minimum(codes, _BMP_SIZE - 1)]
+    outside = codes >= _BMP_SIZE
+    if outside.any():
+        # Символов вне BMP мало: проверяются только их различные коды
+        unique, inverse = np.unique(codes[outside], return_inverse=True)
+        kept = np.array([_is_kept(chr(code)) for code in unique])
+        keep[outside] = kept[inverse]
+    return codes[keep].tobytes().decode("utf-32-le")
+
+
+def read_chunks(source, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Чтение текста порциями из файла (объекта с read) или итерируемого набора строк"""
+    if hasattr(source, "read"):
+        while True:
+            chunk = source.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+    else:
+        yield from source
+
+
+def clean_chunks(source, cleaner=clean_text, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Потоковая очистка: порции источника по одной проходят через cleaner"""
+    for chunk in read_chunks(source, chunk_size):
+        yield cleaner(chunk)
+
+
+def clean_file(
+    source_path, output_path, cleaner=clean_text, chunk_size=DEFAULT_CHUNK_SIZE
+):
+    """Очистка файла порциями без чтения целиком
+
+    Возвращает число символов до и после очистки.
+    """
+    read = written = 0
+    with open(source_path, "r", encoding="utf-8") as source, open(
+        output_path, "w", encoding="utf-8"
+    ) as output:
+        for chunk in read_chunks(source, chunk_size):
+            cleaned = cleaner(chunk)
+            output.write(cleaned)
+            read += len(chunk)
+            written += len(cleaned)
+    return read, written
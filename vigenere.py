@@ -1,47 +1,192 @@
-def clean_text(text):
-    """Очистка текста: оставляет только русские буквы, заменяет Ё на Е"""
-    text = text.upper().replace("Ё", "Е")
-    alphabet = "АБВГДЕЖЗИЙКЛМНОПРСТУФХЦЧШЩЪЫЬЭЮЯ"
-    return "".join(filter(lambda x: x in alphabet, text))
+import numpy as np
 
+from profiling import instrumented
+from text_cleaning import (
+    ALPHABET,
+    DEFAULT_CHUNK_SIZE,
+    NOT_A_LETTER,
+    clean_text,
+    decode_indices,
+    encode_text,
+    read_chunks,
+)
 
+N_LETTERS = len(ALPHABET)
+
+
+class EncodedText:
+    """Очищенный текст, хранящийся как буфер индексов букв (uint8)"""
+
+    __slots__ = ("indices",)
+
+    def __init__(self, indices):
+        self.indices = np.asarray(indices, dtype=np.uint8)
+
+    @classmethod
+    def from_text(cls, text):
+        """Очистка и кодирование строки (выполняется один раз)"""
+        return cls(encode_text(text))
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            # Срез массива - представление без копирования данных
+            return EncodedText(self.indices[item])
+        return ALPHABET[self.indices[item]]
+
+    def __iter__(self):
+        return iter(str(self))
+
+    def __eq__(self, other):
+        if isinstance(other, EncodedText):
+            return np.array_equal(self.indices, other.indices)
+        if isinstance(other, str):
+            return str(self) == other
+        return NotImplemented
+
+    __hash__ = None
+
+    def __str__(self):
+        return decode_indices(self.indices)
+
+    def __repr__(self):
+        preview = str(self[:20])
+        suffix = "..." if len(self) > 20 else ""
+        return f"EncodedText({preview!r}{suffix}, length={len(self)})"
+
+
+def as_encoded(text):
+    """Приведение строки или EncodedText к EncodedText без повторной очистки"""
+    if isinstance(text, EncodedText):
+        return text
+    return EncodedText.from_text(text)
+
+
+def key_period(key):
+    """Минимальный период ключа: длина наименьшего ключа, шифрующего так же
+
+    По префикс-функции: ключ длины n с наибольшим собственным
+    префиксом-суффиксом длины b имеет период n - b, если тот делит n.
+    """
+    letters = as_encoded(key).indices.tolist()
+    size = len(letters)
+    prefix = [0] * size
+    for i in range(1, size):
+        border = prefix[i - 1]
+        while border and letters[i] != letters[border]:
+            border = prefix[border - 1]
+        if letters[i] == letters[border]:
+            border += 1
+        prefix[i] = border
+    if size == 0:
+        return 0
+    period = size - prefix[-1]
+    return period if size % period == 0 else size
+
+
+def primitive_key(key):
+    """Ключ, сокращённый до минимального периода (того же типа, что и ключ)"""
+    encoded = as_encoded(key)
+    primitive = encoded[: key_period(encoded)]
+    return primitive if isinstance(key, EncodedText) else str(primitive)
+
+
+def _tiled_key(key_indices, length):
+    """Ключ, повторённый до длины текста"""
+    repeats = -(-length // len(key_indices))
+    return np.tile(key_indices, repeats)[:length]
+
+
+def encrypt_indices(indices, key_indices):
+    """Шифрование массива индексов: (p + k) mod n одной векторной операцией"""
+    if len(key_indices) == 0:
+        return indices.copy()
+    result = np.add(indices, _tiled_key(key_indices, len(indices)))
+    np.remainder(result, N_LETTERS, out=result)
+    return result
+
+
+def decrypt_indices(indices, key_indices):
+    """Дешифрование массива индексов: (c - k) mod n одной векторной операцией"""
+    if len(key_indices) == 0:
+        return indices.copy()
+    # Добавляем n, чтобы не уходить в отрицательные значения uint8
+    result = np.add(indices, N_LETTERS, dtype=np.uint8)
+    np.subtract(result, _tiled_key(key_indices, len(indices)), out=result)
+    np.remainder(result, N_LETTERS, out=result)
+    return result
+
+
+@instrumented("vigenere_encrypt")
 def vigenere_encrypt(plaintext, key):
-    """Шифрование текста методом Виженера для русского алфавита"""
-    plaintext = clean_text(plaintext)
-    key = clean_text(key)
-    if not key:
-        return plaintext
-
-    alphabet = "АБВГДЕЖЗИЙКЛМНОПРСТУФХЦЧШЩЪЫЬЭЮЯ"
-    n = len(alphabet)
-    char_to_index = {char: i for i, char in enumerate(alphabet)}
-
-    ciphertext = []
-    key_len = len(key)
-    for i, char in enumerate(plaintext):
-        p_idx = char_to_index[char]
-        k_idx = char_to_index[key[i % key_len]]
-        c_idx = (p_idx + k_idx) % n
-        ciphertext.append(alphabet[c_idx])
-    return "".join(ciphertext)
+    """Шифрование текста методом Виженера для алфавита языка анализа
+
+    Для строки возвращает строку, для EncodedText - EncodedText.
+    """
+    result = encrypt_indices(as_encoded(plaintext).indices, as_encoded(key).indices)
+    if isinstance(plaintext, EncodedText):
+        return EncodedText(result)
+    return decode_indices(result)
 
 
+@instrumented("vigenere_decrypt")
 def vigenere_decrypt(ciphertext, key):
-    """Дешифрование текста методом Виженера для русского алфавита"""
-    ciphertext = clean_text(ciphertext)
-    key = clean_text(key)
-    if not key:
-        return ciphertext
-
-    alphabet = "АБВГДЕЖЗИЙКЛМНОПРСТУФХЦЧШЩЪЫЬЭЮЯ"
-    n = len(alphabet)
-    char_to_index = {char: i for i, char in enumerate(alphabet)}
-
-    plaintext = []
-    key_len = len(key)
-    for i, char in enumerate(ciphertext):
-        c_idx = char_to_index[char]
-        k_idx = char_to_index[key[i % key_len]]
-        p_idx = (c_idx - k_idx) % n
-        plaintext.append(alphabet[p_idx])
-    return "".join(plaintext)
+    """Дешифрование текста методом Виженера для алфавита языка анализа
+
+    Для строки возвращает строку, для EncodedText - EncodedText.
+    """
+    result = decrypt_indices(as_encoded(ciphertext).indices, as_encoded(key).indices)
+    if isinstance(ciphertext, EncodedText):
+        return EncodedText(result)
+    return decode_indices(result)
+
+
+def _cipher_chunks(source, key, transform, chunk_size):
+    """Потоковое применение ключа с сохранением фазы ключа между порциями"""
+    key_indices = as_encoded(key).indices
+    phase = 0
+    for chunk in read_chunks(source, chunk_size):
+        indices = encode_text(chunk)
+        if len(indices) == 0:
+            continue
+        if len(key_indices):
+            # Ключ, сдвинутый так, чтобы порция продолжала его с нужной позиции
+            indices = transform(indices, np.roll(key_indices, -phase))
+            phase = (phase + len(indices)) % len(key_indices)
+        yield decode_indices(indices)
+
+
+def encrypt_chunks(source, key, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Генератор порций шифртекста; память - O(chunk_size) независимо от объёма"""
+    return _cipher_chunks(source, key, encrypt_indices, chunk_size)
+
+
+def decrypt_chunks(source, key, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Генератор порций открытого текста; память - O(chunk_size) независимо от объёма"""
+    return _cipher_chunks(source, key, decrypt_indices, chunk_size)
+
+
+def vigenere_encrypt_stream(source, output, key, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Потоковое шифрование из файла/итератора в поток вывода
+
+    Возвращает число зашифрованных букв.
+    """
+    written = 0
+    for chunk in encrypt_chunks(source, key, chunk_size):
+        output.write(chunk)
+        written += len(chunk)
+    return written
+
+
+def vigenere_decrypt_stream(source, output, key, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Потоковое дешифрование из файла/итератора в поток вывода
+
+    Возвращает число расшифрованных букв.
+    """
+    written = 0
+    for chunk in decrypt_chunks(source, key, chunk_size):
+        output.write(chunk)
+        written += len(chunk)
+    return written